@@ -192,7 +192,7 @@ apple_pie_instruction = (
             name = query[len("name:"):].strip()
             results = recipe_book.find_by_name(name)
         elif query.startswith("ingredient:"):
-            ingredients = query[len("ingredient:"):].strip().split("and")
+            ingredients = query[len("ingredient:"):].strip().split(" and ")
             results = recipe_book.search_by_ingredient(ingredients)
         elif query.startswith("cuisine:"):
             cuisine = query[len("cuisine:"):].strip()
@@ -188,7 +188,7 @@ def interactive_recipe_search():
             name = query[len("name:"):].strip()
             results = recipe_book.find_by_name(name)
         elif query.startswith("ingredient:"):
-            ingredients = query[len("ingredient:"):].strip().split("and")
+            ingredients = query[len("ingredient:"):].strip().split(" and ")
             results = recipe_book.search_by_ingredient(ingredients)
         elif query.startswith("cuisine:"):
             cuisine = query[len("cuisine:"):].strip()
@@ -1,90 +1,16 @@
-class Recipe:
-    def __init__(self, name, ingredients, cuisine, aliases=None, instructions=None):
-        """
-        Initialize a recipe with a name, list of ingredients, cuisine type, optional aliases, and instructions.
-        """
-        self.name = name
-        self.ingredients = ingredients
-        self.cuisine = cuisine
-        self.instructions = instructions or "Instructions not available."
-        self.aliases = aliases or []  # Alternate names for the recipe
-
-    def __str__(self):
-        """
-        Return a string representation of the recipe with full details.
-        """
-        ingredients_str = ", ".join(self.ingredients)
-        return (f"Recipe: {self.name}\nCuisine: {self.cuisine}\nIngredients: {ingredients_str}\n"
-                f"Instructions:\n{self.instructions}")
-
-
-class RecipeBook:
-    def __init__(self):
-        """
-        Initialize an empty recipe collection and a dictionary for aliases.
-        """
-        self.recipes = []
-        self.alias_map = {}
-
-    def add_recipe(self, recipe):
-        """
-        Add a new recipe to the collection and update the alias map.
-        """
-        self.recipes.append(recipe)
-        # Add the primary name to the alias map
-        self.alias_map[recipe.name.lower()] = [recipe]
-        for alias in recipe.aliases:
-            alias = alias.lower()
-            if alias not in self.alias_map:
-                self.alias_map[alias] = []
-            self.alias_map[alias].append(recipe)
-
-    def find_by_name(self, name):
-        """
-        Search for a recipe by its exact name or alias.
-        """
-        return self.alias_map.get(name.lower(), [])
-
-    def search_by_ingredient(self, ingredients):
-        """
-        Search for recipes that contain all specified ingredients.
-        """
-        ingredients = [ingredient.strip().lower() for ingredient in ingredients]
-        return [
-            recipe for recipe in self.recipes
-            if all(ingredient in map(str.lower, recipe.ingredients) for ingredient in ingredients)
-        ]
-
-    def search_by_cuisine(self, cuisine):
-        """
-        Search for recipes by cuisine type.
-        """
-        return [recipe for recipe in self.recipes if recipe.cuisine.lower() == cuisine.lower()]
-
-    def general_search(self, query):
-        """
-        Perform a general search across name, aliases, ingredients, and cuisine.
-        """
-        query_lower = query.lower()
-        results = set()
-
-        # Search by name and aliases
-        results.update(self.alias_map.get(query_lower, []))
-
-        # Search by ingredients
-        results.update([recipe for recipe in self.recipes if query_lower in map(str.lower, recipe.ingredients)])
-
-        # Search by cuisine
-        results.update([recipe for recipe in self.recipes if query_lower == recipe.cuisine.lower()])
-
-        return results
-
-    def get_recipe_by_name(self, name):
-        """
-        Get the full recipe by its exact name.
-        """
-        recipes = self.find_by_name(name)
-        return recipes[0] if recipes else None
+import asyncio
+import os
+import sys
+
+try:
+    import readline
+except ImportError:  # Not available on Windows; the Search prompt then has no autocomplete
+    readline = None
+
+from recipe_model import Recipe
+from recipe_book import PAGE_SIZE, RecipeBook
+from recipe_durable import DurableRecipeBook
+from recipe_server import RecipeServer
 
 
 # Function to clear the screen by printing newlines
@@ -92,8 +18,26 @@ def clear_screen():
     print("\n" * 100)
 
 
-# Interactive Input Bar
-def interactive_recipe_search():
+# Readline completer that suggests names, ingredients, and cuisines as the user types
+def recipe_completer(recipe_book):
+    matches = []
+
+    def complete(text, state):
+        if state == 0:
+            field, separator, term = text.partition(":")
+            field = field.strip().lower()
+            if separator and field in ("name", "ingredient", "cuisine"):
+                suggestions = (f"{field}: {term}" for _, term in recipe_book.complete(term.strip(), field=field))
+            else:
+                suggestions = (term for _, term in recipe_book.complete(text.strip()))
+            matches[:] = dict.fromkeys(suggestions)
+        return matches[state] if state < len(matches) else None
+
+    return complete
+
+
+# Build the sample RecipeBook used by the interactive search
+def sample_recipe_book():
     # Create a RecipeBook and add recipes
     recipe_book = RecipeBook()
 
@@ -171,43 +115,96 @@ def interactive_recipe_search():
     recipe_book.add_recipe(Recipe("Burger", ["burger buns", "ground beef", "lettuce", "tomato", "cheese"], "American", ["burger"], burger_instruction))
     recipe_book.add_recipe(Recipe("Apple Pie", ["apples", "granulated sugar", "brown sugar", "lemon juice", "cinnamon", "nutmeg", "ginger", "butter", "flour", "cornstarch", "heavy cream", "coarse sugar", "pie crusts"], "American", ["apple pie"], apple_pie_instruction))
     recipe_book.add_recipe(Recipe("Grilled Cheese Sandwich", ["bread", "cheese", "butter"], "American", ["grilled cheese"]))
+    return recipe_book
+
+
+# Interactive Input Bar
+def load_recipe_book(catalogue_path=None):
+    """
+    Load recipes from a file, a saved catalogue, or a DurableRecipeBook directory.
+    """
+    if catalogue_path and (os.path.isdir(catalogue_path) or catalogue_path.endswith(("/", os.sep))):
+        recipe_book = DurableRecipeBook(catalogue_path)
+        if recipe_book.replayed:
+            print(f"Recovered {recipe_book.replayed} logged changes.")
+        if not recipe_book.recipes:
+            recipe_book.add_recipes(sample_recipe_book().recipes)
+    elif catalogue_path and catalogue_path.endswith((".jsonl", ".csv")):
+        recipe_book = RecipeBook(compact=True)
+        stats = recipe_book.ingest(catalogue_path)
+        print(f"Loaded {stats['recipes']} recipes in {stats['seconds']:.2f}s "
+              f"({stats['recipes_per_second']:,.0f} recipes/s).")
+    elif catalogue_path and os.path.exists(catalogue_path):
+        recipe_book = RecipeBook.open(catalogue_path)
+    else:
+        recipe_book = sample_recipe_book()
+        if catalogue_path:
+            recipe_book.save(catalogue_path)
+    return recipe_book
+
+
+def interactive_recipe_search(catalogue_path=None):
+    recipe_book = load_recipe_book(catalogue_path)
+
+    if readline is not None:
+        readline.set_completer_delims("")
+        readline.set_completer(recipe_completer(recipe_book))
+        readline.parse_and_bind("tab: complete")
 
     print("Welcome to Jer's Recipe Finder!")
     print("Enter queries like:\n- 'name: pancakes'\n- 'ingredient: eggs'\n- 'cuisine: Mexican'\n"
-          "- 'all' to list all recipes.\nType 'exit' to quit.\n")
+          "- 'cuisine:mexican ingredient:(cheese OR beef) -pork'\n"
+          "- 'pantry: eggs, milk, flour' for what you can cook with them\n"
+          "- 'text: \"pizza stone\"' to search the instructions\n"
+          "- 'add: Pad Thai | Thai | rice noodles, egg, peanuts' to add a recipe\n"
+          "- 'all' to list all recipes.\nPress Tab to autocomplete. Type 'exit' to quit.\n")
 
     while True:
         query = input("Search: ").strip()
         clear_screen()
         if query.lower() == "exit":
+            if isinstance(recipe_book, DurableRecipeBook):
+                recipe_book.close()
             print("Goodbye!")
             break
 
+        if query.lower().startswith("add:"):
+            fields = [field.strip() for field in query[4:].split("|")]
+            if len(fields) != 3 or not all(fields):
+                print("\nUse 'add: name | cuisine | ingredient, ingredient, ...'.\n")
+                continue
+            try:
+                ingredients = [ingredient.strip() for ingredient in fields[2].split(",") if ingredient.strip()]
+                recipe_book.add_recipe(Recipe(fields[0], ingredients, fields[1]))
+            except TypeError as error:  # A memory-mapped catalogue is read-only
+                print(f"\n{error}\n")
+                continue
+            print(f"\nAdded {fields[0]}.")
+            if not isinstance(recipe_book, DurableRecipeBook):
+                print("It will be gone when you exit; open a directory catalogue to keep added recipes.")
+            print()
+            continue
+
         if query.lower() == "all":
             print("\nAll Recipes:\n")
+            print(", ".join(f"{cuisine}: {count}" for cuisine, count in recipe_book.cuisine_counts().items()))
+            print()
             for recipe in recipe_book.recipes:
-                print(f"- {recipe.name} ({recipe.cuisine})")
+                if recipe is not None:
+                    print(f"- {recipe.name} ({recipe.cuisine})")
             continue
 
-        # Detect query type or perform general search
-        if query.startswith("name:"):
-            name = query[len("name:"):].strip()
-            results = recipe_book.find_by_name(name)
-        elif query.startswith("ingredient:"):
-            ingredients = query[len("ingredient:"):].strip().split("and")
-            results = recipe_book.search_by_ingredient(ingredients)
-        elif query.startswith("cuisine:"):
-            cuisine = query[len("cuisine:"):].strip()
-            results = recipe_book.search_by_cuisine(cuisine)
-        else:
-            # Perform general search
-            results = recipe_book.general_search(query)
+        # Detect query type or perform general search (with close names in case of a typo),
+        # fetching only the first page of results
+        results, cursor = recipe_book.search_page(query, PAGE_SIZE)
 
         # Display results
         if results:
             print("\nRecipes Found:\n")
             for recipe in results:
                 print(f"- {recipe.name} ({recipe.cuisine})")
+            if cursor:
+                print("\nType 'more' to see more results.")
             print("\nType the name of a recipe to view its details or 'back' to perform another search.\n")
 
             while True:
@@ -215,7 +212,18 @@ def interactive_recipe_search():
                 clear_screen()
                 if selected_recipe.lower() == "back":
                     break
+                if selected_recipe.lower() == "more" and cursor:
+                    results, cursor = recipe_book.search_page(query, PAGE_SIZE, cursor=cursor)
+                    for recipe in results:
+                        print(f"- {recipe.name} ({recipe.cuisine})")
+                    print("\nType 'more' to see more results." if cursor else "\nNo more results.")
+                    continue
                 recipe = recipe_book.get_recipe_by_name(selected_recipe)
+                if recipe is None:
+                    recipes = recipe_book.find_by_name(selected_recipe)
+                    if recipes:
+                        recipe = recipes[0]
+                        print(f"\nNo recipe named '{selected_recipe}'; showing the closest match.")
                 if recipe:
                     print("\nRecipe Details:\n")
                     print(recipe)
@@ -226,6 +234,30 @@ def interactive_recipe_search():
             print("\nNo Recipes Found.\n")
 
 
-# Run the interactive search
+def serve_recipes(catalogue_path=None, host="127.0.0.1", port=8765):
+    """
+    Load a catalogue and serve it over TCP until interrupted.
+    """
+    recipe_book = load_recipe_book(catalogue_path)
+    server = RecipeServer(recipe_book, host, port)
+
+    async def run():
+        host, port = await server.start()
+        print(f"Serving {len(recipe_book.recipes)} recipes on {host}:{port}")
+        await server.serve_forever()
+
+    try:
+        asyncio.run(run())
+    except KeyboardInterrupt:
+        stats = server.latency_stats()
+        print(f"\nServed {stats['requests']} requests, p50 {stats['p50_ms']:.2f} ms, "
+              f"p99 {stats['p99_ms']:.2f} ms")
+
+
+# Run the interactive search, or serve it with --serve [catalogue] [port]
 if __name__ == "__main__":
-    interactive_recipe_search()
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve_recipes(sys.argv[2] if len(sys.argv) > 2 else None,
+                      port=int(sys.argv[3]) if len(sys.argv) > 3 else 8765)
+    else:
+        interactive_recipe_search(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,1165 @@
+import csv
+import json
+import mmap
+import os
+import time
+from array import array
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from heapq import nsmallest
+from itertools import chain, islice
+
+from recipe_model import CompactRecipe, Recipe, Vocabulary
+from recipe_text import ingredient_key, ingredient_keys, recipe_keys
+from recipe_indexes import (AliasIndex, CompletionIndex, FuzzyNameIndex, InstructionIndex, OverlayIndex, PantryIndex,
+                            QueryCache, RecipeBitsets, SimilarityIndex, contains, copy_instruction_entry,
+                            intersect_postings, iter_difference, iter_intersection, lookup_postings)
+from recipe_query import decode_cursor, encode_cursor, parse_query, plan_nodes
+from recipe_catalogue import (CATALOGUE_HEADER, CATALOGUE_MAGIC, MappedIndex, MappedInstructionPostings, MappedRecipes,
+                              OverlayRecipes, encode_recipe, little_endian, pad_to_alignment, read_array,
+                              write_index_section)
+
+
+# How much a match in each field adds to a recipe's general_search score. Each weight is
+# larger than all the weights below it combined, so a name hit always outranks the rest.
+FIELD_WEIGHTS = {"name": 8, "alias": 4, "ingredient": 2, "cuisine": 1}
+
+# Results shown per page at the Search prompt
+PAGE_SIZE = 20
+
+# Rows per task when build_parallel has to hand recipes to its workers itself
+SHARD_ROWS = 50000
+
+
+class RecipeBook:
+    def __init__(self, compact=False, cache_size=1024, cache_ttl=None):
+        """
+        Initialize an empty recipe collection, its indexes, and an LRU query cache (cache_size=0 disables it).
+        """
+        self.vocabulary = Vocabulary() if compact else None
+        self._new_postings = (lambda: array("I")) if compact else list
+        self.recipes = []
+        self.tombstones = self._new_postings()  # Sorted IDs of removed recipes, whose slots hold None
+        self.alias_map = AliasIndex()
+        self.ingredient_index = {}
+        self.cuisine_index = {}
+        self.fuzzy_index = None  # Built on the first typo-tolerant lookup
+        self.completion_index = None  # Built on the first autocomplete request
+        self.pantry_index = None  # Built on the first pantry search
+        self.bitsets = None  # Built on the first filter_recipes or count_recipes call
+        self.similarity_index = SimilarityIndex()
+        self.instruction_index = InstructionIndex()
+        self.query_cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+
+    def add_recipe(self, recipe):
+        """
+        Add a new recipe to the collection and update the indexes.
+        """
+        recipe = self._index_recipe(recipe, self._add_key)
+        if self.pantry_index is not None:
+            self.pantry_index.add(len(self.recipes) - 1, recipe.ingredients)
+        if self.bitsets is not None:
+            keys = [("ingredient", key) for ingredient in recipe.ingredients for key in ingredient_keys(ingredient)]
+            self.bitsets.add(len(self.recipes) - 1, keys + [("cuisine", recipe.cuisine.lower())])
+        self.similarity_index.add(len(self.recipes) - 1, recipe.ingredients)
+        self.instruction_index.add(len(self.recipes) - 1, recipe.instructions)
+        # Drop only the cached answers that read an index key this recipe was just added to
+        if self.query_cache is not None:
+            tags = [("all",), ("fuzzy",), ("cuisine", recipe.cuisine.lower()), ("alias", recipe.name.lower())]
+            tags.extend(("alias", alias.lower()) for alias in recipe.aliases)
+            tags.extend(("ingredient", key) for ingredient in recipe.ingredients for key in ingredient_keys(ingredient))
+            self.query_cache.invalidate(tags)
+
+    def add_recipes(self, recipes):
+        """
+        Add many recipes in one batched pass and return how many were added.
+        """
+        recipe_list = self.recipes
+        alias_map = self.alias_map
+        ingredient_index = self.ingredient_index
+        cuisine_index = self.cuisine_index
+        similarity_index = self.similarity_index
+        instruction_index = self.instruction_index
+        pantry_index = self.pantry_index
+        bitsets = self.bitsets
+        add_key = self._add_key
+        new_postings = self._new_postings
+        vocabulary = self.vocabulary
+        keys = {}  # Cuisine spelling -> index key, so each is lowercased once
+        first_id = len(recipe_list)
+        for recipe_id, recipe in enumerate(recipes, first_id):
+            # Read the fields before the compact conversion, which would only decode them again
+            ingredients = recipe.ingredients
+            cuisine = recipe.cuisine
+            name = recipe.name.lower()
+            aliases = recipe.aliases
+            instructions = recipe.instructions
+            if vocabulary is not None and not isinstance(recipe, CompactRecipe):
+                recipe = CompactRecipe.from_recipe(recipe, vocabulary)
+            recipe_list.append(recipe)
+            key = keys.get(cuisine)
+            if key is None:
+                key = keys[cuisine] = cuisine.lower()
+            postings = cuisine_index.get(key)
+            if postings is None:
+                postings = cuisine_index[key] = new_postings()
+                add_key("cuisine", key)
+            postings.append(recipe_id)
+            for ingredient in ingredients:
+                for key in ingredient_keys(ingredient):
+                    postings = ingredient_index.get(key)
+                    if postings is None:
+                        postings = ingredient_index[key] = new_postings()
+                        add_key("ingredient", key)
+                    if not postings or postings[-1] != recipe_id:
+                        postings.append(recipe_id)
+            for key in chain((name,), map(str.lower, aliases)):
+                if alias_map.add(key, recipe_id):
+                    add_key("name", key)
+            similarity_index.add(recipe_id, ingredients)
+            instruction_index.add(recipe_id, instructions)
+            if pantry_index is not None:
+                pantry_index.add(recipe_id, ingredients)
+            if bitsets is not None:
+                bitsets.add(recipe_id, [("ingredient", key) for ingredient in ingredients
+                                        for key in ingredient_keys(ingredient)] + [("cuisine", cuisine.lower())])
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        return len(recipe_list) - first_id
+
+    def update_recipe(self, recipe_id, recipe):
+        """
+        Replace the recipe with recipe_id by a new version under the same ID and return the old one.
+        """
+        old_recipe = self._live_recipe(recipe_id)
+        if self.vocabulary is not None and not isinstance(recipe, CompactRecipe):
+            recipe = CompactRecipe.from_recipe(recipe, self.vocabulary)
+        old_keys = recipe_keys(old_recipe)
+        new_keys = recipe_keys(recipe)
+        for field, key in old_keys - new_keys:
+            self._unpost(field, key, recipe_id)
+        for field, key in new_keys - old_keys:
+            self._post(field, key, recipe_id)
+        self.recipes[recipe_id] = recipe
+        if self.pantry_index is not None:
+            self.pantry_index.remove(recipe_id, old_recipe.ingredients)
+            self.pantry_index.add(recipe_id, recipe.ingredients)
+        if self.bitsets is not None:
+            self.bitsets.update(recipe_id, [key for key in new_keys - old_keys if key[0] != "name"],
+                                [key for key in old_keys - new_keys if key[0] != "name"])
+        self.similarity_index.remove(recipe_id, old_recipe.ingredients)
+        self.similarity_index.add(recipe_id, recipe.ingredients)
+        self.instruction_index.remove(recipe_id, old_recipe.instructions)
+        self.instruction_index.add(recipe_id, recipe.instructions)
+        self._invalidate(old_keys | new_keys)
+        return old_recipe
+
+    def remove_recipe(self, recipe_id):
+        """
+        Delete the recipe with recipe_id and return it, leaving a None tombstone in its slot.
+        """
+        return self._remove_recipe(recipe_id)
+
+    def remove_recipes(self, recipe_ids):
+        """
+        Delete many recipes and return how many were removed.
+        """
+        count = 0
+        for recipe_id in recipe_ids:
+            self._remove_recipe(recipe_id)
+            count += 1
+        return count
+
+    def _remove_recipe(self, recipe_id):
+        recipe = self._live_recipe(recipe_id)
+        keys = recipe_keys(recipe)
+        for field, key in keys:
+            self._unpost(field, key, recipe_id)
+        self.recipes[recipe_id] = None
+        self.tombstones.insert(bisect_left(self.tombstones, recipe_id), recipe_id)
+        if self.pantry_index is not None:
+            self.pantry_index.remove(recipe_id, recipe.ingredients)
+        if self.bitsets is not None:
+            self.bitsets.remove(recipe_id, [key for key in keys if key[0] != "name"])
+        self.similarity_index.remove(recipe_id, recipe.ingredients)
+        self.instruction_index.remove(recipe_id, recipe.instructions)
+        self._invalidate(keys)
+        return recipe
+
+    def compact(self):
+        """
+        Drop the tombstones and renumber the remaining recipes; return how many slots were reclaimed.
+        """
+        reclaimed = len(self.tombstones)
+        if not reclaimed:
+            return 0
+        new_ids = array("I")
+        recipes = []
+        for recipe in self.recipes:
+            new_ids.append(len(recipes))
+            if recipe is not None:
+                recipes.append(recipe)
+        for index in (self.ingredient_index, self.cuisine_index):
+            for key, postings in index.items():
+                renumbered = self._new_postings()
+                renumbered.extend([new_ids[recipe_id] for recipe_id in postings])
+                index[key] = renumbered
+        self.alias_map = AliasIndex((key, [new_ids[recipe_id] for recipe_id in recipe_ids])
+                                    for key, recipe_ids in self.alias_map.items())
+        self.similarity_index.renumber(new_ids)
+        self.instruction_index.renumber(new_ids, len(recipes))
+        self.recipes = recipes
+        self.tombstones = self._new_postings()
+        # Names and keys are unchanged, so the fuzzy and completion indexes stay
+        self.pantry_index = None
+        self.bitsets = None
+        if self.query_cache is not None:
+            self.query_cache.clear()
+        return reclaimed
+
+    def _live_recipe(self, recipe_id):
+        recipe = self.recipes[recipe_id] if 0 <= recipe_id < len(self.recipes) else None
+        if recipe is None:
+            raise KeyError(f"no recipe with ID {recipe_id}")
+        return recipe
+
+    def _recipe_id(self, recipe):
+        """
+        Return the ID of a recipe object stored in this book, or None for one from elsewhere.
+        """
+        for recipe_id in self.alias_map.get(recipe.name.lower(), []):
+            if self.recipes[recipe_id] is recipe:
+                return recipe_id
+        return None
+
+    def _live_ids(self):
+        """
+        Return the IDs of every recipe not removed, in ascending order.
+        """
+        if not self.tombstones:
+            return range(len(self.recipes))
+        return list(iter_difference(range(len(self.recipes)), [self.tombstones]))
+
+    def _post(self, field, key, recipe_id):
+        """
+        Insert recipe_id into one posting list of the index for field, keeping it sorted.
+        """
+        if field == "name":
+            if self.alias_map.add(key, recipe_id):
+                self._add_key(field, key)
+            return
+        index = self.ingredient_index if field == "ingredient" else self.cuisine_index
+        postings = index.get(key)
+        if postings is None:
+            postings = index[key] = self._new_postings()
+            self._add_key(field, key)
+        postings.insert(bisect_left(postings, recipe_id), recipe_id)
+
+    def _unpost(self, field, key, recipe_id):
+        """
+        Remove recipe_id from one posting list, dropping the key once no recipe has it.
+        """
+        if field == "name":
+            if self.alias_map.discard(key, recipe_id):
+                self._remove_key(field, key)
+            return
+        index = self.ingredient_index if field == "ingredient" else self.cuisine_index
+        postings = index[key]
+        del postings[bisect_left(postings, recipe_id)]
+        if not postings:
+            del index[key]
+            self._remove_key(field, key)
+
+    def _invalidate(self, keys):
+        """
+        Drop the cached answers that read any of an edited recipe's index keys.
+        """
+        if self.query_cache is not None:
+            tags = [("all",), ("fuzzy",)]
+            tags.extend(("alias" if field == "name" else field, key) for field, key in keys)
+            self.query_cache.invalidate(tags)
+
+    @classmethod
+    def build_parallel(cls, source, workers=None, **options):
+        """
+        Build a RecipeBook from a .jsonl/.csv path or an iterable of recipes with a pool of worker processes.
+        """
+        book = cls(**options)
+        workers = workers or os.cpu_count() or 1
+        build_shard = partial(build_index_shard, compact=book.vocabulary is not None)
+        with ProcessPoolExecutor(workers) as pool:
+            for shard in pool.map(build_shard, shard_tasks(source, workers * 4)):
+                book._merge_shard(*shard)
+        book.fuzzy_index = None
+        book.completion_index = None
+        book.pantry_index = None
+        book.bitsets = None
+        if book.query_cache is not None:
+            book.query_cache.clear()
+        return book
+
+    def _merge_shard(self, recipes, alias_map, ingredient_index, cuisine_index, similarity_buckets,
+                     instruction_index):
+        """
+        Append one shard from build_index_shard, shifting its recipe IDs past the recipes already in the book.
+        """
+        offset = len(self.recipes)
+        if self.vocabulary is not None:
+            self._merge_compact(*recipes)
+        else:
+            self.recipes.extend(recipes)
+        for index, shard_index in ((self.ingredient_index, ingredient_index), (self.cuisine_index, cuisine_index)):
+            for key, postings in shard_index.items():
+                existing = index.get(key)
+                if existing is None:
+                    existing = index[key] = self._new_postings()
+                existing.extend([recipe_id + offset for recipe_id in postings] if offset else postings)
+        self.alias_map.merge(alias_map, offset)
+        self.similarity_index.merge(similarity_buckets, offset)
+        self.instruction_index.merge(instruction_index, offset)
+
+    def _merge_compact(self, names, ids, bounds, counts, instructions, strings, data, offsets):
+        """
+        Append a shard's recipes encoded by encode_compact_shard, remapping its string IDs.
+        """
+        vocabulary = self.vocabulary
+        mapping = [vocabulary.intern(string) for string in strings]
+        ids = array("I", map(mapping.__getitem__, ids))
+        store = vocabulary.instructions
+        # Texts compressed against the same dictionary can be appended byte for byte
+        first_text = len(store)
+        data_offset = len(store.data)
+        store.data += data
+        store.offsets.extend([data_offset + offset for offset in offsets[1:]])
+        append = self.recipes.append
+        for position, name in enumerate(names):
+            recipe_ids = ids[bounds[position]:bounds[position + 1]]
+            recipe_ids.insert(1, counts[position])
+            text_id = instructions[position]
+            append(CompactRecipe.from_ids(name, recipe_ids, text_id + first_text if text_id >= 0 else -1, vocabulary))
+
+    def _index_recipe(self, recipe, new_key=None):
+        """
+        Append a recipe and post it in the indexes, calling new_key(field, key) for each new key.
+        """
+        if self.vocabulary is not None and not isinstance(recipe, CompactRecipe):
+            recipe = CompactRecipe.from_recipe(recipe, self.vocabulary)
+        recipe_id = len(self.recipes)
+        self.recipes.append(recipe)
+        cuisine = recipe.cuisine.lower()
+        postings = self.cuisine_index.get(cuisine)
+        if postings is None:
+            postings = self.cuisine_index[cuisine] = self._new_postings()
+            if new_key is not None:
+                new_key("cuisine", cuisine)
+        postings.append(recipe_id)
+        # Post the recipe ID under each ingredient's canonical key and head noun. IDs only
+        # grow, so every posting list stays sorted.
+        for ingredient in recipe.ingredients:
+            for key in ingredient_keys(ingredient):
+                postings = self.ingredient_index.get(key)
+                if postings is None:
+                    postings = self.ingredient_index[key] = self._new_postings()
+                    if new_key is not None:
+                        new_key("ingredient", key)
+                if not postings or postings[-1] != recipe_id:
+                    postings.append(recipe_id)
+        # Post the primary name and aliases alongside any other recipes sharing them
+        for key in chain((recipe.name,), recipe.aliases):
+            key = key.lower()
+            if self.alias_map.add(key, recipe_id) and new_key is not None:
+                new_key("name", key)
+        return recipe
+
+    def ingest(self, path):
+        """
+        Stream recipes from a JSON Lines or CSV file into the book and return the ingest throughput.
+        """
+        start = time.perf_counter()
+        count = self.add_recipes(read_recipes(path))
+        seconds = time.perf_counter() - start
+        return {"recipes": count, "seconds": seconds, "recipes_per_second": count / seconds if seconds else 0.0}
+
+    def _add_key(self, field, key):
+        """
+        Keep the lazily built lookup indexes in step when a new name, ingredient, or cuisine appears.
+        """
+        if field == "name" and self.fuzzy_index is not None:
+            self.fuzzy_index.add(key)
+        if self.completion_index is not None:
+            self.completion_index.add(key, field)
+
+    def _remove_key(self, field, key):
+        """
+        Keep the lazily built lookup indexes in step when no recipe has a key any more.
+        """
+        if field == "name" and self.fuzzy_index is not None:
+            self.fuzzy_index.discard(key)
+        if self.completion_index is not None:
+            self.completion_index.discard(key, field)
+
+    def find_by_name(self, name, fuzzy=True):
+        """
+        Search for a recipe by its exact name or alias, falling back to close names if fuzzy is set.
+        """
+        recipe_ids = self.alias_map.get(name.lower(), [])
+        if not recipe_ids and fuzzy:
+            recipe_ids = {}
+            for key in self.suggest_names(name):
+                recipe_ids.update(dict.fromkeys(self.alias_map.get(key, [])))
+        return [self.recipes[recipe_id] for recipe_id in recipe_ids]
+
+    def suggest_names(self, name, limit=5):
+        """
+        Return up to limit names or aliases within a small edit distance of name, closest first.
+        """
+        if self.fuzzy_index is None:
+            fuzzy_index = FuzzyNameIndex()
+            for key in self.alias_map:
+                fuzzy_index.add(key)
+            # Publish only once fully built, so concurrent readers never see a partial index
+            self.fuzzy_index = fuzzy_index
+        return self.fuzzy_index.suggest(name.lower(), limit)
+
+    def complete(self, prefix, limit=10, field=None):
+        """
+        Return up to limit (field, term) pairs whose term starts with prefix, in alphabetical order.
+        """
+        if self.completion_index is None:
+            completion_index = CompletionIndex()
+            for index_field, index in (("name", self.alias_map), ("ingredient", self.ingredient_index),
+                                       ("cuisine", self.cuisine_index)):
+                for key in index:
+                    completion_index.add(key, index_field)
+            completion_index.merge_pending()
+            self.completion_index = completion_index
+        return self.completion_index.complete(prefix.lower(), limit, field)
+
+    def search_by_ingredient(self, ingredients):
+        """
+        Search for recipes that contain all specified ingredients.
+        """
+        ingredients = tuple(sorted({ingredient_key(ingredient) for ingredient in ingredients}))
+        return list(self._cached_answer(("ingredient", ingredients)))
+
+    def search_by_cuisine(self, cuisine):
+        """
+        Search for recipes by cuisine type.
+        """
+        return [self.recipes[recipe_id] for recipe_id in self.cuisine_index.get(cuisine.lower(), [])]
+
+    def cuisine_count(self, cuisine):
+        """
+        Return how many recipes belong to a cuisine without listing them.
+        """
+        return len(self.cuisine_index.get(cuisine.lower(), []))
+
+    def cuisine_counts(self):
+        """
+        Return a dictionary of cuisine name to recipe count.
+        """
+        return {self.recipes[recipe_ids[0]].cuisine: len(recipe_ids) for recipe_ids in self.cuisine_index.values()}
+
+    def general_search(self, query, limit=None):
+        """
+        Perform a general search across name, aliases, ingredients, and cuisine, best match first.
+        """
+        return list(self._cached_answer(("general", query.lower()), limit=limit))
+
+    def pantry_search(self, pantry, limit=None, max_missing=None):
+        """
+        Return the recipes that use at least one pantry ingredient, fewest missing ingredients first.
+        """
+        pantry = tuple(sorted({ingredient_key(ingredient) for ingredient in pantry}))
+        if max_missing is None:
+            return list(self._cached_answer(("pantry", pantry), limit=limit))
+        return [self.recipes[recipe_id] for _, recipe_id in self.ranked_pantry_search(pantry, limit, max_missing)]
+
+    def ranked_pantry_search(self, pantry, limit=None, max_missing=None):
+        """
+        Return (missing ingredient count, recipe ID) pairs for pantry_search, best first.
+        """
+        pantry_index = self._pantry_index()
+        matched = {}
+        for ingredient in {ingredient_key(ingredient) for ingredient in pantry}:
+            # Skip the recipes posted under this key only as the head noun of a longer ingredient
+            head_only = pantry_index.head_only.get(ingredient, ())
+            for recipe_id in iter_difference(self.ingredient_index.get(ingredient, []), [head_only]):
+                matched[recipe_id] = matched.get(recipe_id, 0) + 1
+        counts = pantry_index.counts
+        ranked = ((counts[recipe_id] - hits, recipe_id) for recipe_id, hits in matched.items())
+        if max_missing is not None:
+            ranked = (pair for pair in ranked if pair[0] <= max_missing)
+        return nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+
+    def _pantry_index(self):
+        if self.pantry_index is None:
+            pantry_index = PantryIndex()
+            for recipe_id, recipe in enumerate(self.recipes):
+                if recipe is not None:
+                    pantry_index.add(recipe_id, recipe.ingredients)
+            self.pantry_index = pantry_index
+        return self.pantry_index
+
+    def filter_recipes(self, all_of=(), any_of=(), none_of=(), cuisine=None, limit=None):
+        """
+        Return the recipes with every ingredient in all_of, one in any_of, and none in none_of.
+        """
+        bitsets = self._recipe_bitsets()
+        bits = self._filter_bits(bitsets, all_of, any_of, none_of, cuisine)
+        return [self.recipes[recipe_id] for recipe_id in bitsets.ids(bits, limit)]
+
+    def count_recipes(self, all_of=(), any_of=(), none_of=(), cuisine=None):
+        """
+        Return how many recipes filter_recipes would return, without listing them.
+        """
+        bitsets = self._recipe_bitsets()
+        return bitsets.count(self._filter_bits(bitsets, all_of, any_of, none_of, cuisine))
+
+    def _filter_bits(self, bitsets, all_of, any_of, none_of, cuisine):
+        bits = bitsets.row("cuisine", cuisine.lower(), self.cuisine_index) if cuisine else bitsets.full()
+        for ingredient in all_of:
+            bits = bits & bitsets.row("ingredient", ingredient_key(ingredient), self.ingredient_index)
+        if any_of:
+            matched = bitsets.empty()
+            for ingredient in any_of:
+                matched = matched | bitsets.row("ingredient", ingredient_key(ingredient), self.ingredient_index)
+            bits = bits & matched
+        for ingredient in none_of:
+            bits = bits & (bitsets.full() ^ bitsets.row("ingredient", ingredient_key(ingredient), self.ingredient_index))
+        return bits
+
+    def _recipe_bitsets(self):
+        if self.bitsets is None:
+            self.bitsets = RecipeBitsets(len(self.recipes), self.tombstones)
+        return self.bitsets
+
+    def search_instructions(self, query, limit=10):
+        """
+        Search the recipe instructions for words and quoted phrases, best match first.
+        """
+        return [self.recipes[recipe_id] for _, recipe_id in self.ranked_instructions(query, limit)]
+
+    def ranked_instructions(self, query, limit=10):
+        """
+        Return (BM25 score, recipe ID) pairs for search_instructions, best first.
+        """
+        return self.instruction_index.search(query, limit)
+
+    def similar(self, recipe, k=5):
+        """
+        Return up to k recipes whose ingredients are most like those of recipe (a recipe or a name).
+        """
+        return [self.recipes[recipe_id] for _, recipe_id in self.ranked_similar(recipe, k)]
+
+    def ranked_similar(self, recipe, k=5):
+        """
+        Return (Jaccard similarity, recipe ID) pairs for similar, best first.
+        """
+        if isinstance(recipe, str):
+            recipe = self.get_recipe_by_name(recipe)
+            if recipe is None:
+                return []
+        query_id = self._recipe_id(recipe)
+        ingredients = {ingredient_key(ingredient) for ingredient in recipe.ingredients}
+        scored = []
+        for candidate_id in self.similarity_index.candidates(ingredients):
+            if candidate_id == query_id:
+                continue
+            candidate = self.recipes[candidate_id]
+            candidate_ingredients = {ingredient_key(ingredient) for ingredient in candidate.ingredients}
+            similarity = len(ingredients & candidate_ingredients) / len(ingredients | candidate_ingredients)
+            scored.append((-similarity, candidate_id))
+        return [(-negative_similarity, recipe_id) for negative_similarity, recipe_id in nsmallest(k, scored)]
+
+    def ranked_search(self, query, limit=None):
+        """
+        Return (score, recipe ID) pairs for general_search, best first.
+        """
+        query_lower = query.lower()
+        return self._rank_hits(query_lower, self.alias_map.get(query_lower, []),
+                               self.ingredient_index.get(ingredient_key(query), []),
+                               self.cuisine_index.get(query_lower, []), limit)
+
+    def _rank_hits(self, query_lower, alias_ids, ingredient_ids, cuisine_ids, limit):
+        """
+        Score the posting lists one general query hit and return the best recipe IDs.
+        """
+        scores = {}
+
+        # Search by name and aliases
+        for recipe_id in alias_ids:
+            field = "name" if self.recipes[recipe_id].name.lower() == query_lower else "alias"
+            scores[recipe_id] = max(scores.get(recipe_id, 0), FIELD_WEIGHTS[field])
+
+        # Search by ingredients
+        for recipe_id in ingredient_ids:
+            scores[recipe_id] = scores.get(recipe_id, 0) + FIELD_WEIGHTS["ingredient"]
+
+        # Search by cuisine
+        if cuisine_ids:
+            for recipe_id in scores:
+                position = bisect_left(cuisine_ids, recipe_id)
+                if position < len(cuisine_ids) and cuisine_ids[position] == recipe_id:
+                    scores[recipe_id] += FIELD_WEIGHTS["cuisine"]
+
+        ranked = ((-score, recipe_id) for recipe_id, score in scores.items())
+        ranked = nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+        results = [(-negative_score, recipe_id) for negative_score, recipe_id in ranked]
+        cuisine_only = (recipe_id for recipe_id in cuisine_ids if recipe_id not in scores)
+        remaining = None if limit is None else max(limit - len(results), 0)
+        results.extend((FIELD_WEIGHTS["cuisine"], recipe_id) for recipe_id in islice(cuisine_only, remaining))
+        return results
+
+    def search(self, query, limit=None):
+        """
+        Answer one query written the way the Search prompt accepts it; see search_many.
+        """
+        return self.search_many([query], limit)[0]
+
+    def search_many(self, queries, limit=None):
+        """
+        Answer a batch of Search prompt queries and return one list of recipes per query.
+        """
+        probed = {}
+
+        def probe(index, key):
+            postings = probed.get((id(index), key))
+            if postings is None:
+                postings = probed[(id(index), key)] = index.get(key, [])
+            return postings
+
+        answers = {}
+        results = []
+        for query in queries:
+            parsed = parse_query(query)
+            answer = answers.get(parsed)
+            if answer is None:
+                answer = self._cached_answer(parsed, probe, limit)
+                if not answer and parsed[0] == "general":
+                    # Nothing matched, so try close names in case of a typo
+                    answer = self._cached_answer(("name", parsed[1]), probe, limit)
+                answers[parsed] = answer
+            results.append(list(answer))
+        return results
+
+    def _cached_answer(self, parsed, probe=None, limit=None):
+        """
+        Answer one parsed query through the query cache, reading posting lists through probe.
+        """
+        if self.query_cache is None:
+            return self._answer(parsed, probe or lookup_postings, limit)[0]
+        key = (parsed, limit)
+        answer = self.query_cache.get(key)
+        if answer is None:
+            answer, tags = self._answer(parsed, probe or lookup_postings, limit)
+            self.query_cache.put(key, answer, tags)
+        return answer
+
+    def _answer(self, parsed, probe, limit):
+        """
+        Answer one parsed query and return the recipes with the cache tags they depend on.
+        """
+        kind, value = parsed
+        if kind == "name":
+            tags = [("alias", value)]
+            recipe_ids = probe(self.alias_map, value)
+            if not recipe_ids:
+                return self.find_by_name(value)[:limit], tags + [("fuzzy",)]
+        elif kind == "ingredient":
+            if not value:
+                return [self.recipes[recipe_id] for recipe_id in self._live_ids()[:limit]], [("all",)]
+            tags = [("ingredient", ingredient) for ingredient in value]
+            recipe_ids = intersect_postings([probe(self.ingredient_index, ingredient) for ingredient in value])
+        elif kind == "cuisine":
+            tags = [("cuisine", value)]
+            recipe_ids = probe(self.cuisine_index, value)
+        elif kind == "boolean":
+            index_tags = {"name": "alias", "ingredient": "ingredient", "cuisine": "cuisine"}
+            tags = []
+            for node in plan_nodes(value):
+                if node[0] == "term":
+                    tags.append((index_tags[node[1]], node[2]))
+                elif node[0] == "not" and ("all",) not in tags:
+                    tags.append(("all",))  # A negation matches recipes no index key points to
+            recipe_ids = self._run_plan(value, probe)
+        elif kind == "text":
+            # Every added recipe changes the BM25 statistics, so any addition can change the answer
+            tags = [("all",)]
+            recipe_ids = [recipe_id for _, recipe_id in self.ranked_instructions(value, limit)]
+        elif kind == "pantry":
+            # Any added recipe that uses a pantry ingredient is also a new candidate
+            tags = [("ingredient", ingredient) for ingredient in value]
+            recipe_ids = [recipe_id for _, recipe_id in self.ranked_pantry_search(value, limit)]
+        else:
+            tags = [("alias", value), ("ingredient", ingredient_key(value)), ("cuisine", value)]
+            recipe_ids = [recipe_id for _, recipe_id in self._rank_hits(
+                value, probe(self.alias_map, value), probe(self.ingredient_index, ingredient_key(value)),
+                probe(self.cuisine_index, value), limit)]
+        return [self.recipes[recipe_id] for recipe_id in islice(recipe_ids, limit)], tags
+
+    def iter_search(self, query, cursor=None):
+        """
+        Lazily yield (cursor, recipe) pairs for a query, resuming after cursor if given.
+        """
+        tier, after = decode_cursor(cursor)
+        for hit_tier, recipe_ids in self._hit_tiers(parse_query(query)):
+            if hit_tier < tier:
+                continue
+            for recipe_id in recipe_ids(after if hit_tier == tier else -1):
+                yield encode_cursor(hit_tier, recipe_id), self.recipes[recipe_id]
+
+    def search_page(self, query, limit=20, offset=0, cursor=None):
+        """
+        Return one page of search results as (recipes, next_cursor).
+        """
+        page = []
+        next_cursor = None
+        for next_cursor, recipe in islice(self.iter_search(query, cursor), offset, offset + limit + 1):
+            page.append((next_cursor, recipe))
+        if len(page) <= limit:
+            return [recipe for _, recipe in page], None
+        page.pop()
+        return [recipe for _, recipe in page], page[-1][0] if page else cursor
+
+    def iter_by_ingredient(self, ingredients):
+        """
+        Yield the recipes that contain all specified ingredients, one at a time.
+        """
+        ingredients = tuple(sorted({ingredient_key(ingredient) for ingredient in ingredients}))
+        for _, recipe_ids in self._hit_tiers(("ingredient", ingredients)):
+            yield from map(self.recipes.__getitem__, recipe_ids(-1))
+
+    def iter_by_cuisine(self, cuisine):
+        """
+        Yield the recipes of a cuisine, one at a time.
+        """
+        for _, recipe_ids in self._hit_tiers(("cuisine", cuisine.lower())):
+            yield from map(self.recipes.__getitem__, recipe_ids(-1))
+
+    def iter_general(self, query):
+        """
+        Yield general_search results best first, one at a time.
+        """
+        for _, recipe in self.iter_search(query):
+            yield recipe
+
+    def _hit_tiers(self, parsed):
+        """
+        Split the answer to a parsed query into (number, recipe_ids) tiers, in result order.
+        """
+        kind, value = parsed
+        if kind == "name":
+            return self._name_tiers(value, 0)
+        if kind == "ingredient":
+            if not value:
+                return [(0, lambda after: iter_difference(self._live_ids(), [], after))]
+            posting_lists = [self.ingredient_index.get(ingredient, []) for ingredient in value]
+            return [(0, lambda after: iter_intersection(posting_lists, after))]
+        if kind == "cuisine":
+            cuisine_ids = self.cuisine_index.get(value, [])
+            return [(0, lambda after: iter_difference(cuisine_ids, [], after))]
+        if kind == "boolean":
+            recipe_ids = self._run_plan(value, lookup_postings)
+            return [(0, lambda after: iter_difference(recipe_ids, [], after))]
+        if kind == "text":
+            # One tier per score, best first
+            by_score = {}
+            for score, recipe_id in self.ranked_instructions(value, None):
+                by_score.setdefault(score, []).append(recipe_id)
+            return [(tier, lambda after, recipe_ids=recipe_ids: iter_difference(recipe_ids, [], after))
+                    for tier, (_, recipe_ids) in enumerate(sorted(by_score.items(), reverse=True))]
+        if kind == "pantry":
+            # One tier per missing ingredient count
+            by_missing = {}
+            for missing, recipe_id in self.ranked_pantry_search(value):
+                by_missing.setdefault(missing, []).append(recipe_id)
+            return [(missing, lambda after, recipe_ids=recipe_ids: iter_difference(recipe_ids, [], after))
+                    for missing, recipe_ids in sorted(by_missing.items())]
+
+        # Name and alias hits are few, so they are scored up front and grouped by score
+        top_score = FIELD_WEIGHTS["name"] + FIELD_WEIGHTS["ingredient"] + FIELD_WEIGHTS["cuisine"]
+        alias_ids = self.alias_map.get(value, [])
+        ingredient_ids = self.ingredient_index.get(ingredient_key(value), [])
+        cuisine_ids = self.cuisine_index.get(value, [])
+        by_score = {}
+        for score, recipe_id in self._rank_hits(value, alias_ids, [], [], None):
+            score += FIELD_WEIGHTS["ingredient"] * contains(ingredient_ids, recipe_id)
+            score += FIELD_WEIGHTS["cuisine"] * contains(cuisine_ids, recipe_id)
+            by_score.setdefault(score, []).append(recipe_id)
+        tiers = [(top_score - score, lambda after, recipe_ids=sorted(recipe_ids): iter_difference(recipe_ids, [], after))
+                 for score, recipe_ids in sorted(by_score.items(), reverse=True)]
+
+        # Everything else scores ingredient + cuisine, ingredient, or cuisine alone
+        named = set(alias_ids)
+        tiers.append((top_score - FIELD_WEIGHTS["ingredient"] - FIELD_WEIGHTS["cuisine"], lambda after: (
+            recipe_id for recipe_id in iter_intersection([ingredient_ids, cuisine_ids], after)
+            if recipe_id not in named)))
+        tiers.append((top_score - FIELD_WEIGHTS["ingredient"], lambda after: (
+            recipe_id for recipe_id in iter_difference(ingredient_ids, [cuisine_ids], after)
+            if recipe_id not in named)))
+        tiers.append((top_score - FIELD_WEIGHTS["cuisine"], lambda after: (
+            recipe_id for recipe_id in iter_difference(cuisine_ids, [ingredient_ids], after)
+            if recipe_id not in named)))
+        if not (alias_ids or ingredient_ids or cuisine_ids):
+            # Nothing matched, so fall back to close names, like search
+            tiers.extend(self._name_tiers(value, top_score + 1))
+        return tiers
+
+    def _run_plan(self, plan, probe):
+        """
+        Evaluate a compiled query plan over the indexes and return the sorted matching recipe IDs.
+        """
+        kind = plan[0]
+        if kind == "term":
+            field, key = plan[1:]
+            if field == "name":
+                return sorted(set(probe(self.alias_map, key)))
+            return probe(self.ingredient_index if field == "ingredient" else self.cuisine_index, key)
+        if kind == "or":
+            recipe_ids = set()
+            for child in plan[1]:
+                recipe_ids.update(self._run_plan(child, probe))
+            return sorted(recipe_ids)
+        if kind == "not":
+            return list(iter_difference(self._live_ids(), [self._run_plan(plan[1], probe)]))
+
+        negated = [child[1] for child in plan[1] if child[0] == "not"]
+        positive = [child for child in plan[1] if child[0] != "not"]
+        # Cheapest first: terms cost one lookup each, groups cost a full evaluation
+        positive.sort(key=lambda child: child[0] != "term")
+        posting_lists = []
+        for child in positive:
+            postings = self._run_plan(child, probe)
+            if not postings:
+                return []
+            posting_lists.append(postings)
+        candidates = intersect_postings(posting_lists) if posting_lists else self._live_ids()
+        if not negated:
+            return candidates
+        return list(iter_difference(candidates, [self._run_plan(child, probe) for child in negated]))
+
+    def _name_tiers(self, name, first_tier):
+        """
+        Return the tiers for a name query: the exact matches, or else one tier per close name.
+        """
+        recipe_ids = self.alias_map.get(name, [])
+        groups = [recipe_ids] if recipe_ids else [self.alias_map.get(key, []) for key in self.suggest_names(name)]
+        tiers = []
+        seen = set()
+        for tier, recipe_ids in enumerate(groups, first_tier):
+            recipe_ids = sorted(set(recipe_ids) - seen)
+            seen.update(recipe_ids)
+            tiers.append((tier, lambda after, recipe_ids=recipe_ids: iter_difference(recipe_ids, [], after)))
+        return tiers
+
+    def cache_stats(self):
+        """
+        Return the query cache's hit, miss, invalidation, and size counters.
+        """
+        if self.query_cache is None:
+            return {"hits": 0, "misses": 0, "invalidations": 0, "size": 0}
+        return self.query_cache.stats()
+
+    def get_recipe_by_name(self, name):
+        """
+        Get the full recipe by its exact name or alias, or None; see find_by_name for typos.
+        """
+        recipes = self.find_by_name(name, fuzzy=False)
+        return recipes[0] if recipes else None
+
+    def save(self, path):
+        """
+        Write the recipes and their indexes to a binary catalogue that RecipeBook.open can memory-map.
+        """
+        with open(path, "wb") as file:
+            file.write(bytes(CATALOGUE_HEADER.size))
+            record_offsets = array("Q")
+            for recipe in self.recipes:
+                if recipe is None:
+                    record_offsets.append(0)  # The header is there, so no record starts at 0
+                    continue
+                record_offsets.append(file.tell())
+                file.write(encode_recipe(recipe))
+            pad_to_alignment(file)
+            record_table = file.tell()
+            file.write(little_endian(record_offsets))
+            sections = [write_index_section(file, index)
+                        for index in (self.alias_map, self.ingredient_index, self.cuisine_index,
+                                      self.similarity_index.buckets, self.instruction_index.flat_postings())]
+            pad_to_alignment(file)
+            sections.append(file.tell())
+            lengths = self.instruction_index.lengths
+            file.write(little_endian(lengths + array("I", [0]) * (len(self.recipes) - len(lengths))))
+            sections.append(file.tell())
+            file.write(little_endian(array("I", self.tombstones)))
+            file.seek(0)
+            file.write(CATALOGUE_HEADER.pack(CATALOGUE_MAGIC, len(self.recipes), record_table, *sections,
+                                             len(self.tombstones)))
+
+    def copy(self):
+        """
+        Return an independent in-memory copy of the book and the indexes built so far.
+        """
+        book = RecipeBook(cache_size=0)
+        book.vocabulary = self.vocabulary
+        book._new_postings = self._new_postings
+        book.recipes = list(self.recipes)
+        book.tombstones = self.tombstones[:]
+        if isinstance(self.alias_map, AliasIndex):
+            book.alias_map = self.alias_map.copy()
+        else:  # A memory-mapped book's alias map is copied entry by entry
+            book.alias_map = AliasIndex(self.alias_map.items())
+        book.ingredient_index = {key: postings[:] for key, postings in self.ingredient_index.items()}
+        book.cuisine_index = {key: postings[:] for key, postings in self.cuisine_index.items()}
+        self._copy_lookup_indexes(book)
+        return book
+
+    def _copy_lookup_indexes(self, book):
+        """
+        Give a copy of this book its own copies of the indexes built from the recipes.
+        """
+        book.similarity_index = self.similarity_index.copy()
+        book.instruction_index = self.instruction_index.copy()
+        if self.fuzzy_index is not None:
+            book.fuzzy_index = self.fuzzy_index.copy()
+        if self.completion_index is not None:
+            book.completion_index = self.completion_index.copy()
+        if self.pantry_index is not None:
+            book.pantry_index = self.pantry_index.copy()
+        if self.bitsets is not None:
+            book.bitsets = self.bitsets.copy(book.tombstones)
+        if self.query_cache is not None:
+            book.query_cache = QueryCache(self.query_cache.maxsize, self.query_cache.ttl)
+
+    @classmethod
+    def open(cls, path):
+        """
+        Open a catalogue written by save() as a read-only, memory-mapped book.
+        """
+        return MappedRecipeBook(path)
+
+
+class MappedRecipeBook(RecipeBook):
+    """
+    A read-only RecipeBook served from a memory-mapped catalogue file.
+    """
+    def __init__(self, path):
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, count, record_table, alias_section, ingredient_section, cuisine_section, similarity_section,
+         instruction_section, lengths_table, tombstone_table,
+         tombstone_count) = CATALOGUE_HEADER.unpack_from(self._map, 0)
+        if magic != CATALOGUE_MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a recipe catalogue")
+        self.vocabulary = None
+        self._new_postings = list
+        self.tombstones = list(read_array(self._map, tombstone_table, tombstone_count))
+        self.fuzzy_index = None
+        self.completion_index = None
+        self.pantry_index = None
+        self.bitsets = None
+        self.query_cache = QueryCache()
+        self.recipes = MappedRecipes(self._map, record_table, count)
+        self.alias_map = MappedIndex(self._map, alias_section)
+        self.ingredient_index = MappedIndex(self._map, ingredient_section)
+        self.cuisine_index = MappedIndex(self._map, cuisine_section)
+        self.similarity_index = SimilarityIndex(buckets=MappedIndex(self._map, similarity_section))
+        self.instruction_index = InstructionIndex(MappedInstructionPostings(MappedIndex(self._map, instruction_section)),
+                                                  read_array(self._map, lengths_table, count))
+
+    def add_recipe(self, recipe):
+        raise TypeError("a memory-mapped RecipeBook is read-only; use copy() for an editable book")
+
+    def add_recipes(self, recipes):
+        raise TypeError("a memory-mapped RecipeBook is read-only; use copy() for an editable book")
+
+    def update_recipe(self, recipe_id, recipe):
+        raise TypeError("a memory-mapped RecipeBook is read-only; use copy() for an editable book")
+
+    def remove_recipe(self, recipe_id):
+        raise TypeError("a memory-mapped RecipeBook is read-only; use copy() for an editable book")
+
+    def remove_recipes(self, recipe_ids):
+        raise TypeError("a memory-mapped RecipeBook is read-only; use copy() for an editable book")
+
+    def close(self):
+        """
+        Release the memory map and the underlying file.
+        """
+        self._map.close()
+        self._file.close()
+
+
+class OverlayRecipeBook(MappedRecipeBook):
+    """
+    An editable RecipeBook over a memory-mapped catalogue, keeping changes in memory.
+    """
+    def __init__(self, path, compact=False):
+        super().__init__(path)
+        if compact:
+            self.vocabulary = Vocabulary()
+            self._new_postings = lambda: array("I")
+        self.recipes = OverlayRecipes(self.recipes)
+        self.alias_map = OverlayIndex(self.alias_map)
+        self.ingredient_index = OverlayIndex(self.ingredient_index)
+        self.cuisine_index = OverlayIndex(self.cuisine_index)
+        self.similarity_index.buckets = OverlayIndex(self.similarity_index.buckets)
+        self.instruction_index.postings = OverlayIndex(self.instruction_index.postings, copy_instruction_entry)
+
+    add_recipe = RecipeBook.add_recipe
+    update_recipe = RecipeBook.update_recipe
+    remove_recipe = RecipeBook.remove_recipe
+    remove_recipes = RecipeBook.remove_recipes
+
+    def add_recipes(self, recipes):
+        """
+        Add many recipes one at a time and return how many were added.
+        """
+        count = 0
+        for recipe in recipes:
+            self.add_recipe(recipe)
+            count += 1
+        return count
+
+    def _index(self, field):
+        if field == "name":
+            return self.alias_map
+        return self.ingredient_index if field == "ingredient" else self.cuisine_index
+
+    def _index_recipe(self, recipe, new_key=None):
+        if self.vocabulary is not None and not isinstance(recipe, CompactRecipe):
+            recipe = CompactRecipe.from_recipe(recipe, self.vocabulary)
+        recipe_id = len(self.recipes)
+        self.recipes.append(recipe)
+        for field, key in recipe_keys(recipe):
+            if self._index(field).add(key, recipe_id) and new_key is not None:
+                new_key(field, key)
+        return recipe
+
+    def _post(self, field, key, recipe_id):
+        if self._index(field).add(key, recipe_id):
+            self._add_key(field, key)
+
+    def _unpost(self, field, key, recipe_id):
+        if self._index(field).discard(key, recipe_id):
+            self._remove_key(field, key)
+
+    def copy(self):
+        """
+        Return an independent copy sharing the memory map; see RecipeBook.copy.
+        """
+        book = OverlayRecipeBook.__new__(OverlayRecipeBook)
+        book._file = self._file
+        book._map = self._map
+        book.vocabulary = self.vocabulary
+        book._new_postings = self._new_postings
+        # compact() leaves a plain list and AliasIndex behind
+        book.recipes = self.recipes.copy() if isinstance(self.recipes, OverlayRecipes) else list(self.recipes)
+        book.tombstones = self.tombstones[:]
+        book.alias_map = self.alias_map.copy()
+        book.ingredient_index = self.ingredient_index.copy()
+        book.cuisine_index = self.cuisine_index.copy()
+        book.fuzzy_index = None
+        book.completion_index = None
+        book.pantry_index = None
+        book.bitsets = None
+        book.query_cache = None
+        self._copy_lookup_indexes(book)
+        return book
+
+
+def read_recipes(path):
+    """
+    Stream Recipe objects from a .jsonl or .csv file, one row at a time.
+    """
+    if path.endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as file:
+            for row in csv.DictReader(file):
+                yield Recipe(row["name"], split_list(row["ingredients"]), row["cuisine"],
+                             split_list(row.get("aliases")), row.get("instructions") or None)
+    else:
+        for row in read_json_lines(path):
+            yield Recipe(*row)
+
+
+def read_json_lines(path, start=0, end=None):
+    """
+    Yield recipe rows from the lines of a JSON Lines file that start inside [start, end).
+    """
+    with open(path, "rb") as file:
+        if start:
+            # Skip the rest of a line that began before this range
+            file.seek(start - 1)
+            file.readline()
+        while end is None or file.tell() < end:
+            line = file.readline()
+            if not line:
+                break
+            if line.strip():
+                row = json.loads(line)
+                yield row["name"], row["ingredients"], row["cuisine"], row.get("aliases"), row.get("instructions")
+
+
+def shard_tasks(source, shard_count):
+    """
+    Split a build_parallel source into worker tasks.
+    """
+    if isinstance(source, str) and source.endswith(".jsonl"):
+        size = os.path.getsize(source)
+        step = max(-(-size // shard_count), 1)
+        for start in range(0, size, step):
+            yield "jsonl", source, start, min(start + step, size)
+        return
+    recipes = read_recipes(source) if isinstance(source, str) else source
+    chunk = []
+    for recipe in recipes:
+        chunk.append((recipe.name, list(recipe.ingredients), recipe.cuisine, list(recipe.aliases),
+                      recipe.instructions))
+        if len(chunk) == SHARD_ROWS:
+            yield "rows", chunk
+            chunk = []
+    if chunk:
+        yield "rows", chunk
+
+
+def build_index_shard(task, compact=False):
+    """
+    Worker for RecipeBook.build_parallel: index one shard with shard-local recipe IDs.
+    """
+    if task[0] == "jsonl":
+        rows = read_json_lines(*task[1:])
+    else:
+        rows = task[1]
+    book = RecipeBook(compact=compact, cache_size=0)
+    book.add_recipes(Recipe(*row) for row in rows)
+    recipes = encode_compact_shard(book) if compact else book.recipes
+    return (recipes, book.alias_map, book.ingredient_index, book.cuisine_index, book.similarity_index.buckets,
+            book.instruction_index)
+
+
+def encode_compact_shard(book):
+    """
+    Flatten a compact shard book's recipes for sending back to build_parallel.
+    """
+    ids = array("I")
+    bounds = array("I", [0])
+    counts = array("I")
+    for recipe in book.recipes:
+        ids.append(recipe._ids[0])
+        ids.extend(recipe._ids[2:])
+        bounds.append(len(ids))
+        counts.append(recipe._ids[1])
+    store = book.vocabulary.instructions
+    return ([recipe.name for recipe in book.recipes], ids, bounds, counts,
+            array("i", [recipe._instructions for recipe in book.recipes]),
+            book.vocabulary.strings, bytes(store.data), store.offsets)
+
+
+def split_list(field):
+    """
+    Split a semicolon-separated CSV field into a list of stripped, non-empty items.
+    """
+    return [item.strip() for item in (field or "").split(";") if item.strip()]
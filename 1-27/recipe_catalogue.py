@@ -0,0 +1,299 @@
+import struct
+import sys
+import weakref
+from array import array
+from collections.abc import Mapping, Sequence
+
+from recipe_model import Recipe
+
+
+# Binary catalogue layout (see RecipeBook.save): a fixed header, the encoded recipe
+# records, a table of record offsets (0 for a removed recipe), one sorted key section per
+# index, the word count of every recipe's instructions, then the IDs of removed recipes.
+# Every number is little-endian on any platform, so catalogues can be copied between
+# machines. The magic changes whenever the layout or the meaning of the stored keys does
+# (RCPBOK2: canonical ingredients, RCPBOK3: -ie plurals and plural-only nouns, RCPBOK4: -is
+# and -che plurals, heads of synonyms, RCPBOK5: similarity buckets, RCPBOK6: instruction
+# postings and lengths, RCPBOK7: removed recipes keep their slots).
+CATALOGUE_MAGIC = b"RCPBOK7L"
+CATALOGUE_HEADER = struct.Struct("<8sQQQQQQQQQQ")
+RECORD_HEADER = struct.Struct("<HH")
+LENGTH = struct.Struct("<I")
+OFFSET = struct.Struct("<Q")
+
+
+class MappedRecipe:
+    """
+    A recipe decoded from a catalogue record.
+    """
+    __slots__ = ("name", "ingredients", "cuisine", "aliases", "_buffer", "_instructions_at", "__weakref__")
+
+    def __init__(self, buffer, offset):
+        ingredient_count, alias_count = RECORD_HEADER.unpack_from(buffer, offset)
+        offset += RECORD_HEADER.size
+        fields = []
+        for _ in range(2 + ingredient_count + alias_count):
+            text, offset = read_text(buffer, offset)
+            fields.append(text)
+        self.name = fields[0]
+        self.cuisine = fields[1]
+        self.ingredients = fields[2:2 + ingredient_count]
+        self.aliases = fields[2 + ingredient_count:]
+        self._buffer = buffer
+        self._instructions_at = offset
+
+    @property
+    def instructions(self):
+        return read_text(self._buffer, self._instructions_at)[0]
+
+    __str__ = Recipe.__str__
+
+
+class MappedRecipes(Sequence):
+    """
+    Read-only list of the recipes in a catalogue, decoded on access.
+    """
+    def __init__(self, buffer, record_table, count):
+        self._buffer = buffer
+        self._record_table = record_table
+        self._count = count
+        self._decoded = weakref.WeakValueDictionary()
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, recipe_id):
+        if isinstance(recipe_id, slice):
+            return [self[i] for i in range(*recipe_id.indices(self._count))]
+        if recipe_id < 0:
+            recipe_id += self._count
+        if not 0 <= recipe_id < self._count:
+            raise IndexError("recipe id out of range")
+        recipe = self._decoded.get(recipe_id)
+        if recipe is None:
+            offset = OFFSET.unpack_from(self._buffer, self._record_table + OFFSET.size * recipe_id)[0]
+            if not offset:
+                return None
+            recipe = self._decoded[recipe_id] = MappedRecipe(self._buffer, offset)
+        return recipe
+
+
+class OverlayRecipes(Sequence):
+    """
+    The recipe list of an OverlayRecipeBook: the catalogue's recipes plus the changes since.
+    """
+    def __init__(self, base):
+        self._base = base
+        self._replaced = {}  # Recipe ID in the catalogue -> the recipe now, or None once removed
+        self._added = []
+
+    def __len__(self):
+        return len(self._base) + len(self._added)
+
+    def __getitem__(self, recipe_id):
+        if isinstance(recipe_id, slice):
+            return [self[i] for i in range(*recipe_id.indices(len(self)))]
+        if recipe_id < 0:
+            recipe_id += len(self)
+        if recipe_id >= len(self._base):
+            return self._added[recipe_id - len(self._base)]
+        if recipe_id in self._replaced:
+            return self._replaced[recipe_id]
+        return self._base[recipe_id]
+
+    def __setitem__(self, recipe_id, recipe):
+        if recipe_id < 0:
+            recipe_id += len(self)
+        if recipe_id >= len(self._base):
+            self._added[recipe_id - len(self._base)] = recipe
+        elif recipe_id >= 0:
+            self._replaced[recipe_id] = recipe
+        else:
+            raise IndexError("recipe id out of range")
+
+    def append(self, recipe):
+        self._added.append(recipe)
+
+    def copy(self):
+        recipes = OverlayRecipes(self._base)
+        recipes._replaced = self._replaced.copy()
+        recipes._added = list(self._added)
+        return recipes
+
+
+class MappedPostings(Sequence):
+    """
+    A sorted posting list of recipe IDs read straight out of the memory map.
+    """
+    def __init__(self, buffer, offset, count):
+        self._buffer = buffer
+        self._offset = offset
+        self._count = count
+
+    def __len__(self):
+        return self._count
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            return [self[i] for i in range(*position.indices(self._count))]
+        if position < 0:
+            position += self._count
+        if not 0 <= position < self._count:
+            raise IndexError("posting out of range")
+        return LENGTH.unpack_from(self._buffer, self._offset + LENGTH.size * position)[0]
+
+    def __iter__(self):
+        return iter(self.to_array())
+
+    def to_array(self):
+        """
+        Return all the postings as one array("I"), in a single copy out of the memory map.
+        """
+        return read_array(self._buffer, self._offset, self._count)
+
+
+class MappedInstructionPostings(Mapping):
+    """
+    Read-only view of a saved instruction index section.
+    """
+    def __init__(self, index):
+        self._index = index
+
+    def __getitem__(self, word):
+        postings = self._index[word].to_array()
+        count = postings[0]
+        return [postings[1:1 + count], postings[1 + count:1 + 2 * count], postings[1 + 2 * count:]]
+
+    def __contains__(self, word):
+        return word in self._index
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self._index)
+
+
+class MappedIndex(Mapping):
+    """
+    Read-only view of one index section: keys are binary-searched in the memory map.
+    """
+    def __init__(self, buffer, offset):
+        self._buffer = buffer
+        self._count = OFFSET.unpack_from(buffer, offset)[0]
+        self._entry_table = offset + OFFSET.size
+
+    def _entry(self, position):
+        offset = OFFSET.unpack_from(self._buffer, self._entry_table + OFFSET.size * position)[0]
+        key_length, posting_count = struct.unpack_from("<II", self._buffer, offset)
+        key_start = offset + 8
+        return key_start, key_length, posting_count
+
+    def _key(self, position):
+        key_start, key_length, _ = self._entry(position)
+        return self._buffer[key_start:key_start + key_length]
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        return (self._key(position).decode("utf-8") for position in range(self._count))
+
+    def __getitem__(self, key):
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key(middle) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low == self._count or self._key(low) != target:
+            raise KeyError(key)
+        key_start, key_length, posting_count = self._entry(low)
+        return MappedPostings(self._buffer, aligned(key_start + key_length, LENGTH.size), posting_count)
+
+
+def encode_text(text):
+    """
+    Encode a string as a 4-byte length followed by its UTF-8 bytes.
+    """
+    data = text.encode("utf-8")
+    return LENGTH.pack(len(data)) + data
+
+
+def read_text(buffer, offset):
+    """
+    Decode a length-prefixed string and return it with the offset just past it.
+    """
+    length = LENGTH.unpack_from(buffer, offset)[0]
+    start = offset + LENGTH.size
+    return buffer[start:start + length].decode("utf-8"), start + length
+
+
+def encode_recipe(recipe):
+    """
+    Encode one catalogue record. The instructions go last so they can be skipped until needed.
+    """
+    ingredients = recipe.ingredients
+    aliases = recipe.aliases
+    fields = [recipe.name, recipe.cuisine, *ingredients, *aliases, recipe.instructions]
+    return RECORD_HEADER.pack(len(ingredients), len(aliases)) + b"".join(map(encode_text, fields))
+
+
+def aligned(offset, alignment):
+    """
+    Round an offset up to the next multiple of alignment.
+    """
+    return -(-offset // alignment) * alignment
+
+
+def pad_to_alignment(file, alignment=OFFSET.size):
+    """
+    Write zero bytes until the file position is a multiple of alignment.
+    """
+    position = file.tell()
+    file.write(bytes(aligned(position, alignment) - position))
+
+
+def read_array(buffer, offset, count, typecode="I"):
+    """
+    Return count little-endian numbers stored at offset in buffer as an array.
+    """
+    values = array(typecode)
+    values.frombytes(buffer[offset:offset + values.itemsize * count])
+    if sys.byteorder == "big":
+        values.byteswap()
+    return values
+
+
+def little_endian(values):
+    """
+    Return the bytes of an array of numbers in little-endian order, as the catalogue stores them.
+    """
+    if sys.byteorder == "big":
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values.tobytes()
+
+
+def write_index_section(file, index):
+    """
+    Write an index as a sorted key section and return the offset where it starts.
+    """
+    entries = sorted((key.encode("utf-8"), postings) for key, postings in index.items())
+    pad_to_alignment(file)
+    section = file.tell()
+    entry_offsets = array("Q")
+    file.write(OFFSET.pack(len(entries)) + bytes(OFFSET.size * len(entries)))
+    for key, postings in entries:
+        pad_to_alignment(file, LENGTH.size)
+        entry_offsets.append(file.tell())
+        file.write(struct.pack("<II", len(key), len(postings)) + key)
+        pad_to_alignment(file, LENGTH.size)
+        file.write(little_endian(array("I", postings)))
+    end = file.tell()
+    file.seek(section + OFFSET.size)
+    file.write(little_endian(entry_offsets))
+    file.seek(end)
+    return section
@@ -0,0 +1,321 @@
+import json
+import os
+import re
+import struct
+import threading
+import zlib
+
+from recipe_model import Recipe
+from recipe_book import OverlayRecipeBook, RecipeBook
+
+
+# Write-ahead log records (see RecipeLog): the payload's length and CRC32, then the payload,
+# a JSON object describing one write to the book
+LOG_RECORD = struct.Struct("<II")
+LOG_FILE = re.compile(r"(snapshot|wal)-(\d+)\.(rcpb|log)$")
+
+# Logged writes after which DurableRecipeBook saves a snapshot and starts a new log
+CHECKPOINT_RECORDS = 10000
+
+
+class ConcurrentRecipeBook:
+    """
+    A RecipeBook shared between threads: reads take no lock, writes publish a changed copy.
+    """
+    def __init__(self, recipe_book=None):
+        recipe_book = recipe_book if recipe_book is not None else RecipeBook()
+        recipe_book.query_cache = None
+        self.snapshot = recipe_book
+        self._write_lock = threading.Lock()
+
+    def add_recipe(self, recipe):
+        return self._write(lambda recipe_book: recipe_book.add_recipe(recipe))
+
+    def add_recipes(self, recipes):
+        return self._write(lambda recipe_book: recipe_book.add_recipes(recipes))
+
+    def update_recipe(self, recipe_id, recipe):
+        return self._write(lambda recipe_book: recipe_book.update_recipe(recipe_id, recipe))
+
+    def remove_recipe(self, recipe_id):
+        return self._write(lambda recipe_book: recipe_book.remove_recipe(recipe_id))
+
+    def remove_recipes(self, recipe_ids):
+        return self._write(lambda recipe_book: recipe_book.remove_recipes(recipe_ids))
+
+    def compact(self):
+        return self._write(lambda recipe_book: recipe_book.compact())
+
+    def _write(self, change):
+        with self._write_lock:
+            recipe_book = self.snapshot.copy()
+            recipe_book.query_cache = None
+            result = change(recipe_book)
+            self.snapshot = recipe_book
+        return result
+
+    def __getattr__(self, name):
+        # Everything else (searches, recipes, indexes) is read from the current snapshot
+        return getattr(self.snapshot, name)
+
+
+class RecipeLog:
+    """
+    Append-only write-ahead log whose writers share fsyncs (group commit).
+    """
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "ab")
+        self._condition = threading.Condition()
+        self._pending = []
+        self._written = 0  # Records queued so far
+        self._durable = 0  # Records known to be on disk
+        self._syncing = False
+        self._failure = None
+        self.syncs = 0
+
+    def write(self, record):
+        """
+        Queue a record and return its sequence number, for sync().
+        """
+        payload = json.dumps(record, separators=(",", ":")).encode("utf-8")
+        with self._condition:
+            self._pending.append(LOG_RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+            self._written += 1
+            return self._written
+
+    def sync(self, sequence=None):
+        """
+        Return once the record with this sequence number (by default, every record queued) is on disk.
+        """
+        with self._condition:
+            sequence = self._written if sequence is None else sequence
+            while self._durable < sequence:
+                self.check()
+                if self._syncing:
+                    self._condition.wait()
+                    continue
+                self._syncing = True
+                batch, self._pending = self._pending, []
+                target = self._written
+                self._condition.release()
+                try:
+                    self._file.write(b"".join(batch))
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                except OSError as error:
+                    # The file may now end in part of a record, so nothing more can be appended
+                    self._failure = error
+                finally:
+                    self._condition.acquire()
+                    self._syncing = False
+                    self._condition.notify_all()
+                if self._failure is None:
+                    self._durable = target
+                    self.syncs += 1
+
+    def check(self):
+        """
+        Raise OSError if an earlier sync failed, after which nothing more can be logged.
+        """
+        if self._failure is not None:
+            raise OSError(f"writing {self.path} failed") from self._failure
+
+    def close(self):
+        self.sync()
+        self._file.close()
+
+
+class DurableRecipeBook:
+    """
+    A RecipeBook whose writes are logged to disk and checkpointed as snapshot catalogues.
+    """
+    def __init__(self, directory, compact=True, concurrent=False, checkpoint_records=CHECKPOINT_RECORDS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.checkpoint_records = checkpoint_records
+        self._write_lock = threading.Lock()
+        generations = [int(match.group(2)) for match in map(LOG_FILE.match, os.listdir(directory))
+                       if match and match.group(1) == "snapshot"]
+        self.generation = max(generations, default=0)
+        self.compact_recipes = compact
+        self.concurrent = concurrent
+        if generations:
+            recipe_book = OverlayRecipeBook(self._path("snapshot"), compact=compact)
+        else:
+            recipe_book = RecipeBook(compact=compact)
+        # Replay before wrapping: every ConcurrentRecipeBook write copies the book
+        self.replayed = self._replay(self._path("wal"), recipe_book)
+        self.recipe_book = ConcurrentRecipeBook(recipe_book) if concurrent else recipe_book
+        self._records = self.replayed
+        self.log = RecipeLog(self._path("wal"))
+        sync_directory(directory)
+        self._remove_old_generations()
+
+    def _path(self, kind, generation=None):
+        generation = self.generation if generation is None else generation
+        return os.path.join(self.directory, f"{kind}-{generation}.{'rcpb' if kind == 'snapshot' else 'log'}")
+
+    def _replay(self, path, recipe_book):
+        """
+        Apply the writes logged in path to recipe_book and return how many there were.
+        """
+        if not os.path.exists(path):
+            return 0
+        records, end = read_log(path)
+        for record in records:
+            self._apply(record, recipe_book)
+        if end < os.path.getsize(path):
+            with open(path, "r+b") as file:
+                file.truncate(end)
+                os.fsync(file.fileno())
+        return len(records)
+
+    def _apply(self, record, recipe_book):
+        operation = record["op"]
+        if operation == "add":
+            return recipe_book.add_recipes([recipe_from_dict(row) for row in record["recipes"]])
+        if operation == "update":
+            return recipe_book.update_recipe(record["id"], recipe_from_dict(record["recipe"]))
+        if operation == "remove":
+            return recipe_book.remove_recipes(record["ids"])
+        if operation == "compact":
+            return recipe_book.compact()
+        raise ValueError(f"unknown operation {operation!r} in the recipe log")
+
+    def add_recipe(self, recipe):
+        # add_recipe keeps the rest of the query cache, which add_recipes clears;
+        # replaying the record with add_recipes ends the same
+        self._write({"op": "add", "recipes": [recipe_as_dict(recipe)]}, lambda: self.recipe_book.add_recipe(recipe))
+
+    def add_recipes(self, recipes):
+        recipes = list(recipes)
+        return self._write({"op": "add", "recipes": [recipe_as_dict(recipe) for recipe in recipes]},
+                           lambda: self.recipe_book.add_recipes(recipes))
+
+    def update_recipe(self, recipe_id, recipe):
+        return self._write({"op": "update", "id": recipe_id, "recipe": recipe_as_dict(recipe)},
+                           lambda: self.recipe_book.update_recipe(recipe_id, recipe))
+
+    def remove_recipe(self, recipe_id):
+        return self._write({"op": "remove", "ids": [recipe_id]}, lambda: self.recipe_book.remove_recipe(recipe_id))
+
+    def remove_recipes(self, recipe_ids):
+        recipe_ids = list(recipe_ids)
+        return self._write({"op": "remove", "ids": recipe_ids}, lambda: self.recipe_book.remove_recipes(recipe_ids))
+
+    def compact(self):
+        return self._write({"op": "compact"}, self.recipe_book.compact)
+
+    def _write(self, record, change):
+        # Applying first keeps writes the book rejects out of the log; applying and queueing
+        # under one lock keeps the log in the order the book saw the writes. Once the log has
+        # failed, a write could never be made durable, so it is refused before it is applied
+        with self._write_lock:
+            self.log.check()
+            result = change()
+            log = self.log
+            sequence = log.write(record)
+            self._records += 1
+            # At or past the limit: a crash before the last checkpoint finished can leave more
+            # records to replay than checkpoint_records
+            checkpoint = self._records >= self.checkpoint_records
+        log.sync(sequence)
+        if checkpoint:
+            self.checkpoint(due_only=True)
+        return result
+
+    def checkpoint(self, due_only=False):
+        """
+        Save the book as a new snapshot and start a new, empty log.
+        """
+        with self._write_lock:
+            if due_only and self._records < self.checkpoint_records:
+                return
+            self.log.sync()
+            generation = self.generation + 1
+            path = self._path("snapshot", generation)
+            self.recipe_book.save(path + ".tmp")
+            with open(path + ".tmp", "rb") as file:
+                os.fsync(file.fileno())
+            os.replace(path + ".tmp", path)
+            sync_directory(self.directory)
+            self.log.close()
+            self._reopen(path)
+            self.generation = generation
+            self.log = RecipeLog(self._path("wal"))
+            sync_directory(self.directory)
+            self._records = 0
+            self._remove_old_generations()
+
+    def _reopen(self, path):
+        """
+        Swap the book for an OverlayRecipeBook over the snapshot just saved.
+        """
+        recipe_book = self.recipe_book.snapshot if self.concurrent else self.recipe_book
+        reopened = OverlayRecipeBook(path, compact=self.compact_recipes)
+        reopened.fuzzy_index = recipe_book.fuzzy_index
+        reopened.completion_index = recipe_book.completion_index
+        reopened.pantry_index = recipe_book.pantry_index
+        reopened.bitsets = recipe_book.bitsets
+        self.recipe_book = ConcurrentRecipeBook(reopened) if self.concurrent else reopened
+
+    def _remove_old_generations(self):
+        for name in os.listdir(self.directory):
+            match = LOG_FILE.match(name)
+            if (match and int(match.group(2)) < self.generation) or name.endswith(".rcpb.tmp"):
+                os.remove(os.path.join(self.directory, name))
+
+    def close(self):
+        self.log.close()
+
+    def __getattr__(self, name):
+        # Searches and everything else are read from the book
+        return getattr(self.recipe_book, name)
+
+
+def recipe_as_dict(recipe):
+    """
+    Return a recipe's fields as a JSON-ready dictionary, in the JSON Lines row format.
+    """
+    return {"name": recipe.name, "ingredients": list(recipe.ingredients), "cuisine": recipe.cuisine,
+            "aliases": list(recipe.aliases), "instructions": recipe.instructions}
+
+
+def recipe_from_dict(row):
+    """
+    Build a Recipe from a dictionary in the JSON Lines row format (see recipe_as_dict).
+    """
+    return Recipe(row["name"], row["ingredients"], row["cuisine"], row.get("aliases"), row.get("instructions"))
+
+
+def read_log(path):
+    """
+    Read a RecipeLog file and return its whole records and the offset where they end.
+    """
+    with open(path, "rb") as file:
+        data = file.read()
+    records = []
+    offset = 0
+    while offset + LOG_RECORD.size <= len(data):
+        length, checksum = LOG_RECORD.unpack_from(data, offset)
+        start = offset + LOG_RECORD.size
+        payload = data[start:start + length]
+        if len(payload) < length or zlib.crc32(payload) != checksum:
+            break
+        records.append(json.loads(payload))
+        offset = start + length
+    return records, offset
+
+
+def sync_directory(path):
+    """
+    fsync a directory, so that files just created or renamed in it survive a crash.
+    """
+    if os.name == "nt":
+        return
+    descriptor = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(descriptor)
+    finally:
+        os.close(descriptor)
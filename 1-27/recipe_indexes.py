@@ -0,0 +1,963 @@
+import math
+import random
+import re
+import struct
+import sys
+import time
+import zlib
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+from collections.abc import Mapping, MutableMapping
+from functools import partial
+from heapq import nsmallest
+from itertools import chain, islice
+
+try:
+    import numpy
+except ImportError:  # Bitset filters then use Python integers as bitsets
+    numpy = None
+
+from recipe_text import deletion_variants, edit_distance, ingredient_key, ingredient_keys, typo_budget
+
+
+# MinHash signature shape for similar(): BANDS x ROWS hash values per recipe. Two recipes
+# share an LSH bucket with probability 1 - (1 - J**ROWS)**BANDS for ingredient Jaccard
+# similarity J, which passes 50% at J = 0.5 and 96% at J = 0.7.
+MINHASH_BANDS = 16
+MINHASH_ROWS = 4
+
+# Signature values are 31-bit, packed 32 bits apart into one int with each slot's top bit
+# free as a guard, so two signatures are merged slot by slot in a few big-int operations
+SIGNATURE = struct.Struct(f"<{MINHASH_BANDS * MINHASH_ROWS}I")
+SIGNATURE_GUARDS = int.from_bytes(SIGNATURE.pack(*[1 << 31] * (MINHASH_BANDS * MINHASH_ROWS)), "little")
+
+# BM25 parameters for search_instructions: term frequency saturation and length normalization
+BM25_K1 = 1.2
+BM25_B = 0.75
+INSTRUCTION_TOKEN = re.compile(r"[a-z0-9]+")
+INSTRUCTION_QUERY = re.compile(r'"([^"]*)"|(\S+)')
+
+
+class AliasIndex(Mapping):
+    """
+    Multi-map from lowercased names and aliases to the sorted IDs of every recipe they name.
+    """
+    def __init__(self, items=()):
+        self._postings = {}
+        self._owned = set()  # Keys whose array no copy shares, so it can be changed in place
+        for key, recipe_ids in items:
+            self.extend(key, recipe_ids)
+
+    def _own(self, key, postings):
+        if key not in self._owned:
+            postings = self._postings[key] = postings[:]
+            self._owned.add(key)
+        return postings
+
+    def add(self, key, recipe_id):
+        """
+        Post recipe_id under key, keeping the IDs sorted. Return True if key is new.
+        """
+        postings = self._postings.get(key)
+        if postings is None:
+            self._postings[key] = recipe_id
+            return True
+        if type(postings) is int:
+            if postings != recipe_id:
+                self._postings[key] = array("I", sorted((postings, recipe_id)))
+                self._owned.add(key)
+        elif postings[-1] < recipe_id:
+            self._own(key, postings).append(recipe_id)
+        elif not contains(postings, recipe_id):
+            self._own(key, postings).insert(bisect_left(postings, recipe_id), recipe_id)
+        return False
+
+    def discard(self, key, recipe_id):
+        """
+        Remove recipe_id from key's postings, if it is there. Return True if key is now gone.
+        """
+        postings = self._postings.get(key)
+        if postings is None:
+            return False
+        if type(postings) is int:
+            if postings != recipe_id:
+                return False
+            del self._postings[key]
+            return True
+        position = bisect_left(postings, recipe_id)
+        if position < len(postings) and postings[position] == recipe_id:
+            if len(postings) == 2:
+                self._postings[key] = postings[1 - position]
+                self._owned.discard(key)
+            else:
+                del self._own(key, postings)[position]
+        return False
+
+    def extend(self, key, recipe_ids):
+        """
+        Post ascending recipe_ids under key, all past the IDs already there.
+        """
+        for recipe_id in recipe_ids:
+            self.add(key, recipe_id)
+
+    def merge(self, other, offset=0):
+        """
+        Post every key of another AliasIndex with its recipe IDs shifted by offset.
+        """
+        for key, postings in other._postings.items():
+            if type(postings) is not int:
+                self.extend(key, [recipe_id + offset for recipe_id in postings])
+            elif key in self._postings:
+                self.add(key, postings + offset)
+            else:
+                self._postings[key] = postings + offset
+
+    def __getitem__(self, key):
+        postings = self._postings[key]
+        return (postings,) if type(postings) is int else postings
+
+    def get(self, key, default=None):
+        postings = self._postings.get(key)
+        if postings is None:
+            return default
+        return (postings,) if type(postings) is int else postings
+
+    def __contains__(self, key):
+        return key in self._postings
+
+    def __len__(self):
+        return len(self._postings)
+
+    def __iter__(self):
+        return iter(self._postings)
+
+    def copy(self):
+        index = AliasIndex()
+        index._postings = self._postings.copy()
+        # Every array is now shared, so neither index may change one in place any more
+        self._owned = set()
+        return index
+
+
+class FuzzyNameIndex:
+    """
+    Typo-tolerant index of names and aliases, matching words through their deletion variants.
+    """
+    def __init__(self):
+        # Deletion variant -> tuple of the words it was derived from. Tuples are never changed
+        # in place, so a copy of the index can share them.
+        self.variants = {}
+        self.keys_by_word = {}
+        self._owned = set()  # Words whose key list no copy shares, as in AliasIndex
+
+    def _keys(self, word):
+        keys = self.keys_by_word[word]
+        if word not in self._owned:
+            keys = self.keys_by_word[word] = keys[:]
+            self._owned.add(word)
+        return keys
+
+    def add(self, key):
+        variants = self.variants
+        for word in set(key.split()):
+            if word not in self.keys_by_word:
+                self.keys_by_word[word] = []
+                self._owned.add(word)
+                for variant in deletion_variants(word, typo_budget(word)):
+                    variants[variant] = variants.get(variant, ()) + (word,)
+            self._keys(word).append(key)
+
+    def copy(self):
+        index = FuzzyNameIndex()
+        index.variants = self.variants.copy()
+        index.keys_by_word = self.keys_by_word.copy()
+        self._owned = set()
+        return index
+
+    def discard(self, key):
+        """
+        Forget a key. Its words' deletion variants stay, and simply stop leading anywhere.
+        """
+        for word in set(key.split()):
+            keys = self.keys_by_word.get(word)
+            if keys is not None and key in keys:
+                self._keys(word).remove(key)
+
+    def close_words(self, word):
+        """
+        Return (distance, word) pairs for indexed words within the typo budget of word, closest first.
+        """
+        max_distance = typo_budget(word)
+        distances = {}
+        for variant in deletion_variants(word, max_distance):
+            for candidate in self.variants.get(variant, ()):
+                if candidate not in distances:
+                    distances[candidate] = edit_distance(word, candidate)
+        return sorted((distance, candidate) for candidate, distance in distances.items() if distance <= max_distance)
+
+    def suggest(self, text, limit):
+        """
+        Rank the keys with a close match for every word of text by total edit distance.
+        """
+        words = text.split()
+        scores = None
+        for word in words:
+            matches = {}
+            for distance, match in self.close_words(word):
+                for key in self.keys_by_word[match]:
+                    if key not in matches:
+                        matches[key] = distance
+            if scores is not None:
+                matches = {key: scores[key] + distance for key, distance in matches.items() if key in scores}
+            scores = matches
+            if not scores:
+                return []
+        if scores is None:
+            return []
+        extra_words = len(words)
+        return [key for _, _, key in nsmallest(
+            limit, ((distance, len(key.split()) - extra_words, key) for key, distance in scores.items()))]
+
+
+class RecipeBitsets:
+    """
+    Whole-catalogue bitsets of the recipes with each ingredient or cuisine, built on first use.
+    """
+    def __init__(self, size, removed=()):
+        self.size = size
+        self.capacity = size + 1024 if numpy is not None else size
+        self.removed = removed  # Tombstoned recipe IDs, left out of the full bitset
+        self.rows = {}
+        self._full = None
+
+    def _pack(self, recipe_ids):
+        if numpy is not None:
+            row = numpy.zeros((self.capacity + 7) // 8, dtype=numpy.uint8)
+            recipe_ids = numpy.fromiter(recipe_ids, dtype=numpy.int64, count=len(recipe_ids))
+            numpy.bitwise_or.at(row, recipe_ids >> 3, numpy.left_shift(1, recipe_ids & 7).astype(numpy.uint8))
+            return row
+        packed = bytearray((self.size + 7) // 8)
+        for recipe_id in recipe_ids:
+            packed[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        return int.from_bytes(packed, "little")
+
+    def row(self, field, key, index):
+        """
+        Return the bitset of the recipes with key in field, packing it from index on first use.
+        """
+        bits = self.rows.get((field, key))
+        if bits is None:
+            bits = self.rows[(field, key)] = self._pack(index.get(key, []))
+        return bits
+
+    def full(self):
+        """
+        Return the bitset of every recipe.
+        """
+        if self._full is None:
+            if numpy is not None:
+                full = self._pack(range(self.size))
+            else:
+                full = (1 << self.size) - 1
+            for recipe_id in self.removed:
+                full = self._clear(full, recipe_id)
+            self._full = full
+        return self._full
+
+    def empty(self):
+        return self._pack([])
+
+    def add(self, recipe_id, keys):
+        """
+        Set recipe_id in the full bitset and in the rows of the keys that have been packed.
+        """
+        if numpy is not None and recipe_id >= self.capacity:
+            # Grow every row by half at once, so appends stay amortized O(1) per row
+            self.capacity = max(recipe_id + 1, self.capacity + self.capacity // 2)
+            width = (self.capacity + 7) // 8
+            for row_key, bits in self.rows.items():
+                self.rows[row_key] = numpy.concatenate([bits, numpy.zeros(width - len(bits), dtype=numpy.uint8)])
+            self._full = None
+        self.size = recipe_id + 1
+        self.update(recipe_id, keys, ())
+        if self._full is not None:
+            self._full = self._set(self._full, recipe_id)
+
+    def update(self, recipe_id, added, removed):
+        """
+        Set recipe_id in the packed rows of the added keys and clear it in those of the removed keys.
+        """
+        for keys, change in ((set(added), self._set), (set(removed), self._clear)):
+            for key in keys:
+                bits = self.rows.get(key)
+                if bits is not None:
+                    self.rows[key] = change(bits, recipe_id)
+
+    def remove(self, recipe_id, keys):
+        """
+        Clear a deleted recipe from the rows of its keys and from the full bitset.
+        """
+        self.update(recipe_id, (), keys)
+        if self._full is not None:
+            self._full = self._clear(self._full, recipe_id)
+
+    def copy(self, removed):
+        """
+        Return a copy for a book copy whose tombstones are removed.
+        """
+        bitsets = RecipeBitsets(self.size, removed)
+        bitsets.capacity = self.capacity
+        if numpy is None:  # Python integers are immutable, so copies can share them
+            bitsets.rows = self.rows.copy()
+            bitsets._full = self._full
+        else:
+            bitsets.rows = {key: bits.copy() for key, bits in self.rows.items()}
+            bitsets._full = self._full.copy() if self._full is not None else None
+        return bitsets
+
+    def _set(self, bits, recipe_id):
+        if numpy is None:
+            return bits | (1 << recipe_id)
+        bits[recipe_id >> 3] |= 1 << (recipe_id & 7)
+        return bits
+
+    def _clear(self, bits, recipe_id):
+        if numpy is None:
+            return bits & ~(1 << recipe_id)
+        bits[recipe_id >> 3] &= 0xFF ^ (1 << (recipe_id & 7))
+        return bits
+
+    def count(self, bits):
+        """
+        Return the number of recipes in a bitset.
+        """
+        if numpy is None:
+            return bits.bit_count()
+        if hasattr(numpy, "bitwise_count"):
+            return int(numpy.bitwise_count(bits).sum())
+        return int(numpy.unpackbits(bits).sum())
+
+    def ids(self, bits, limit=None):
+        """
+        Return the recipe IDs in a bitset in ascending order, at most limit of them.
+        """
+        if numpy is not None:
+            return numpy.flatnonzero(numpy.unpackbits(bits, bitorder="little"))[:limit].tolist()
+        words = array("Q", bits.to_bytes(8 * ((self.size + 63) // 64), "little"))
+        if sys.byteorder == "big":
+            words.byteswap()
+        recipe_ids = []
+        for position, word in enumerate(words):
+            while word:
+                lowest = word & -word
+                recipe_ids.append(64 * position + lowest.bit_length() - 1)
+                if len(recipe_ids) == limit:
+                    return recipe_ids
+                word ^= lowest
+        return recipe_ids
+
+
+class PantryIndex:
+    """
+    Distinct ingredient counts per recipe and head-noun-only postings for pantry search.
+    """
+    def __init__(self):
+        self.counts = array("I")
+        self.head_only = AliasIndex()
+
+    def _keys(self, ingredients):
+        keys = [ingredient_keys(ingredient) for ingredient in ingredients]
+        canonical = {ingredient[0] for ingredient in keys}
+        return canonical, {head for ingredient in keys for head in ingredient[1:]} - canonical
+
+    def add(self, recipe_id, ingredients):
+        """
+        Count a new recipe, or a recipe re-added under its ID after remove().
+        """
+        canonical, heads = self._keys(ingredients)
+        if recipe_id >= len(self.counts):
+            self.counts.extend([0] * (recipe_id - len(self.counts)))
+            self.counts.append(len(canonical))
+        else:
+            self.counts[recipe_id] = len(canonical)
+        for head in heads:
+            self.head_only.add(head, recipe_id)
+
+    def remove(self, recipe_id, ingredients):
+        """
+        Forget a recipe; ingredients must be the ones it was added with.
+        """
+        _, heads = self._keys(ingredients)
+        self.counts[recipe_id] = 0
+        for head in heads:
+            self.head_only.discard(head, recipe_id)
+
+    def copy(self):
+        index = PantryIndex()
+        index.counts = self.counts[:]
+        index.head_only = self.head_only.copy()
+        return index
+
+
+class SimilarityIndex:
+    """
+    MinHash signatures of recipe ingredient sets, bucketed by LSH banding.
+    """
+    def __init__(self, seed=0, buckets=None):
+        size = MINHASH_BANDS * MINHASH_ROWS
+        generator = random.Random(seed)
+        # Universal hash functions (a * x + b) mod p, one per signature value
+        self.prime = (1 << 31) - 1
+        self.coefficients = [(generator.randrange(1, self.prime), generator.randrange(self.prime)) for _ in range(size)]
+        self.hashes = {}  # Ingredient -> its values under every hash function, packed as a SIGNATURE
+        self.buckets = buckets if buckets is not None else AliasIndex()
+
+    def _ingredient_hashes(self, ingredient):
+        hashes = self.hashes.get(ingredient)
+        if hashes is None:
+            # crc32 rather than hash(), which changes between runs for strings
+            x = zlib.crc32(ingredient.encode("utf-8"))
+            prime = self.prime
+            hashes = self.hashes[ingredient] = int.from_bytes(
+                SIGNATURE.pack(*[(a * x + b) % prime for a, b in self.coefficients]), "little")
+        return hashes
+
+    def _band_keys(self, ingredients):
+        """
+        Return the bucket keys for a set of canonical ingredient keys, one per band.
+        """
+        hashes = map(self._ingredient_hashes, ingredients)
+        signature = next(hashes)
+        for other in hashes:
+            # Slot-wise minimum: a slot's guard bit survives the subtraction where signature >= other
+            smaller = (((signature | SIGNATURE_GUARDS) - other) & SIGNATURE_GUARDS) >> 31
+            signature ^= (signature ^ other) & (smaller * self.prime)
+        signature = signature.to_bytes(SIGNATURE.size, "little")
+        band_size = SIGNATURE.size // MINHASH_BANDS
+        # crc32 rather than hash(), so the keys are the same in every process and on disk
+        return [f"{band}:{zlib.crc32(signature[start:start + band_size])}"
+                for band, start in enumerate(range(0, SIGNATURE.size, band_size))]
+
+    def add(self, recipe_id, ingredients):
+        ingredients = {ingredient_key(ingredient) for ingredient in ingredients}
+        if not ingredients:
+            return
+        for band_key in self._band_keys(ingredients):
+            self.buckets.add(band_key, recipe_id)
+
+    def remove(self, recipe_id, ingredients):
+        """
+        Take a recipe out of its buckets; ingredients must be the ones it was added with.
+        """
+        ingredients = {ingredient_key(ingredient) for ingredient in ingredients}
+        if not ingredients:
+            return
+        for band_key in self._band_keys(ingredients):
+            self.buckets.discard(band_key, recipe_id)
+
+    def merge(self, buckets, offset):
+        """
+        Add the buckets of another SimilarityIndex with their recipe IDs shifted by offset.
+        """
+        self.buckets.merge(buckets, offset)
+
+    def renumber(self, new_ids):
+        """
+        Map every recipe ID through new_ids (see RecipeBook.compact).
+        """
+        self.buckets = AliasIndex((key, [new_ids[recipe_id] for recipe_id in recipe_ids])
+                                  for key, recipe_ids in self.buckets.items())
+
+    def copy(self):
+        # The hash memo is only ever added to, so copies can share it
+        index = SimilarityIndex.__new__(SimilarityIndex)
+        index.prime = self.prime
+        index.coefficients = self.coefficients
+        index.hashes = self.hashes
+        if isinstance(self.buckets, (AliasIndex, OverlayIndex)):
+            index.buckets = self.buckets.copy()
+        else:  # Memory-mapped buckets are copied entry by entry
+            index.buckets = AliasIndex(self.buckets.items())
+        return index
+
+    def candidates(self, ingredients):
+        """
+        Return the IDs of the recipes sharing at least one bucket with a set of canonical ingredient keys.
+        """
+        if not ingredients:
+            return set()
+        recipe_ids = set()
+        for band_key in self._band_keys(ingredients):
+            recipe_ids.update(self.buckets.get(band_key, ()))
+        return recipe_ids
+
+
+class InstructionIndex:
+    """
+    A positional inverted index over recipe instructions.
+    """
+    def __init__(self, postings=None, lengths=None):
+        self.postings = postings if postings is not None else {}  # Word -> [recipe IDs, position ends, positions]
+        self.lengths = lengths if lengths is not None else array("I")  # Words per recipe, indexed by recipe ID
+        self.total_length = sum(self.lengths)
+        self.documents = len(self.lengths) - self.lengths.count(0)
+
+    def add(self, recipe_id, instructions):
+        """
+        Index the instructions of a recipe that is not indexed yet.
+        """
+        words = self._words(instructions)
+        if recipe_id >= len(self.lengths):
+            self.lengths.extend([0] * (recipe_id - len(self.lengths)))
+            self.lengths.append(len(words))
+        else:
+            self.lengths[recipe_id] = len(words)
+        if not words:
+            return
+        self.total_length += len(words)
+        self.documents += 1
+        positions_by_word = {}
+        for position, word in enumerate(words):
+            positions_by_word.setdefault(word, []).append(position)
+        for word, positions in positions_by_word.items():
+            entry = self.postings.get(word)
+            if entry is None:
+                entry = self.postings[word] = [array("I"), array("I"), array("I")]
+            recipe_ids, ends, all_positions = entry
+            if not recipe_ids or recipe_ids[-1] < recipe_id:
+                recipe_ids.append(recipe_id)
+                all_positions.extend(positions)
+                ends.append(len(all_positions))
+            else:
+                index = bisect_left(recipe_ids, recipe_id)
+                start = ends[index - 1] if index else 0
+                recipe_ids.insert(index, recipe_id)
+                all_positions[start:start] = array("I", positions)
+                ends.insert(index, start)
+                for later in range(index, len(ends)):
+                    ends[later] += len(positions)
+            # Stored back, since an entry read from a memory-mapped catalogue is a copy
+            self.postings[word] = entry
+
+    def remove(self, recipe_id, instructions):
+        """
+        Take a recipe out of the index; instructions must be the ones it was added with.
+        """
+        words = self._words(instructions)
+        self.lengths[recipe_id] = 0
+        if not words:
+            return
+        self.total_length -= len(words)
+        self.documents -= 1
+        for word in set(words):
+            recipe_ids, ends, positions = entry = self.postings[word]
+            index = bisect_left(recipe_ids, recipe_id)
+            start = ends[index - 1] if index else 0
+            count = ends[index] - start
+            del recipe_ids[index]
+            del positions[start:start + count]
+            del ends[index]
+            for later in range(index, len(ends)):
+                ends[later] -= count
+            if entry[0]:
+                self.postings[word] = entry
+            else:
+                del self.postings[word]
+
+    def merge(self, other, offset):
+        """
+        Add the postings of another InstructionIndex with their recipe IDs shifted by offset.
+        """
+        for word, (recipe_ids, ends, positions) in other.postings.items():
+            entry = self.postings.get(word)
+            if entry is None:
+                entry = self.postings[word] = [array("I"), array("I"), array("I")]
+            start = len(entry[2])
+            entry[0].extend([recipe_id + offset for recipe_id in recipe_ids] if offset else recipe_ids)
+            entry[1].extend([end + start for end in ends] if start else ends)
+            entry[2].extend(positions)
+        self.lengths.extend([0] * (offset - len(self.lengths)))
+        self.lengths.extend(other.lengths)
+        self.total_length += other.total_length
+        self.documents += other.documents
+
+    def renumber(self, new_ids, count):
+        """
+        Map every recipe ID through new_ids for a book of count recipes.
+        """
+        for word, (recipe_ids, ends, positions) in list(self.postings.items()):
+            self.postings[word] = [array("I", [new_ids[recipe_id] for recipe_id in recipe_ids]), ends, positions]
+        lengths = array("I", [0]) * count
+        for recipe_id, length in enumerate(self.lengths):
+            if length:
+                lengths[new_ids[recipe_id]] = length
+        self.lengths = lengths
+
+    def copy(self):
+        index = InstructionIndex()
+        if isinstance(self.postings, OverlayIndex):
+            index.postings = self.postings.copy()
+        else:
+            index.postings = {word: copy_instruction_entry(entry) for word, entry in self.postings.items()}
+        index.lengths = array("I", self.lengths)
+        index.total_length = self.total_length
+        index.documents = self.documents
+        return index
+
+    def flat_postings(self):
+        """
+        Return each word's arrays joined into one, led by the recipe count, for saving.
+        """
+        return {word: array("I", [len(recipe_ids)]) + recipe_ids + ends + positions
+                for word, (recipe_ids, ends, positions) in self.postings.items()}
+
+    def _words(self, instructions):
+        if instructions == "Instructions not available.":
+            return []
+        return INSTRUCTION_TOKEN.findall(instructions.lower())
+
+    def _positions(self, entry, index):
+        return entry[2][entry[1][index - 1] if index else 0:entry[1][index]]
+
+    def _contains_phrase(self, recipe_id, phrase, entries):
+        # Positions of the phrase's first word, shifted down by each later word's offset
+        starts = None
+        for offset, word in enumerate(phrase):
+            entry = entries[word]
+            positions = {position - offset for position in self._positions(entry, bisect_left(entry[0], recipe_id))}
+            starts = positions if starts is None else starts & positions
+            if not starts:
+                return False
+        return True
+
+    def search(self, query, limit=10):
+        """
+        Return (BM25 score, recipe ID) pairs for a query of words and quoted phrases, best first.
+        """
+        phrases = []
+        words = []
+        for phrase, word in INSTRUCTION_QUERY.findall(query.lower()):
+            tokens = INSTRUCTION_TOKEN.findall(phrase if phrase else word)
+            if phrase and len(tokens) > 1:
+                phrases.append(tokens)
+            words.extend(tokens)
+        words = list(dict.fromkeys(words))
+        if not words or not self.documents:
+            return []
+        # Each word's postings are read once: from a memory map every read decodes a copy
+        entries_by_word = {word: self.postings.get(word) for word in words}
+        if any(entries_by_word[word] is None for phrase in phrases for word in phrase):
+            return []
+
+        candidates = None
+        if phrases:
+            # Intersect the phrase words' recipe lists, then check positions only on the survivors
+            phrase_words = {word for phrase in phrases for word in phrase}
+            candidates = intersect_postings([entries_by_word[word][0] for word in phrase_words])
+            candidates = {recipe_id for recipe_id in candidates
+                          if all(self._contains_phrase(recipe_id, phrase, entries_by_word) for phrase in phrases)}
+            if not candidates:
+                return []
+
+        # Score the rarest words first (MaxScore): once the top results so far outscore anything
+        # the remaining words could add up to, a recipe matching only those words cannot make
+        # the cut, so common words are looked up for the existing candidates instead of walked
+        average_length = self.total_length / self.documents
+        entries = []
+        for word in words:
+            entry = entries_by_word[word]
+            if entry is not None:
+                entries.append((math.log(1 + (self.documents - len(entry[0]) + 0.5) / (len(entry[0]) + 0.5)), entry))
+        entries.sort(key=lambda item: -item[0])
+        remaining_bound = sum(idf * (BM25_K1 + 1) for idf, _ in entries)
+        scores = dict.fromkeys(candidates, 0) if candidates is not None else {}
+        for idf, entry in entries:
+            recipe_ids, ends = entry[0], entry[1]
+            lookup = candidates is not None and len(candidates) < len(recipe_ids)
+            if not lookup and candidates is None and limit is not None and len(scores) >= limit:
+                lookup = nsmallest(limit, (-score for score in scores.values()))[-1] < -remaining_bound
+            remaining_bound -= idf * (BM25_K1 + 1)
+            if lookup:
+                pairs = []
+                for recipe_id in scores:
+                    index = bisect_left(recipe_ids, recipe_id)
+                    if index < len(recipe_ids) and recipe_ids[index] == recipe_id:
+                        pairs.append((recipe_id, ends[index] - (ends[index - 1] if index else 0)))
+            else:
+                pairs = zip(recipe_ids, (end - previous for end, previous in zip(ends, chain((0,), ends))))
+            for recipe_id, frequency in pairs:
+                if candidates is not None and recipe_id not in candidates:
+                    continue
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[recipe_id] / average_length)
+                scores[recipe_id] = scores.get(recipe_id, 0) + idf * frequency * (BM25_K1 + 1) / (frequency + norm)
+        ranked = ((-score, recipe_id) for recipe_id, score in scores.items())
+        ranked = nsmallest(limit, ranked) if limit is not None else sorted(ranked)
+        return [(-negative_score, recipe_id) for negative_score, recipe_id in ranked]
+
+
+class QueryCache:
+    """
+    Bounded LRU cache of query results, tagged with the index keys each was computed from.
+    """
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()  # Key -> (expiry time or None, value, tags), oldest first
+        self.keys_by_tag = {}
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is not None and entry[0] is not None and entry[0] < time.monotonic():
+            self._remove(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value, tags):
+        if key in self.entries:
+            self._remove(key)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        self.entries[key] = (expires, value, tags)
+        for tag in tags:
+            self.keys_by_tag.setdefault(tag, set()).add(key)
+        while len(self.entries) > self.maxsize:
+            self._remove(next(iter(self.entries)))
+
+    def invalidate(self, tags):
+        """
+        Drop every entry tagged with any of the given tags.
+        """
+        for tag in tags:
+            for key in list(self.keys_by_tag.get(tag, ())):
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.keys_by_tag.clear()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "invalidations": self.invalidations,
+                "size": len(self.entries)}
+
+    def _remove(self, key):
+        _, _, tags = self.entries.pop(key)
+        for tag in tags:
+            keys = self.keys_by_tag[tag]
+            keys.discard(key)
+            if not keys:
+                del self.keys_by_tag[tag]
+
+
+class CompletionIndex:
+    """
+    Sorted array of (term, field) pairs for prefix autocomplete.
+    """
+    def __init__(self):
+        self.entries = []
+        self.pending = []
+
+    def add(self, term, field):
+        self.pending.append((term, field))
+
+    def discard(self, term, field):
+        self.merge_pending()
+        position = bisect_left(self.entries, (term, field))
+        if position < len(self.entries) and self.entries[position] == (term, field):
+            del self.entries[position]
+
+    def copy(self):
+        index = CompletionIndex()
+        index.entries = self.entries[:]
+        index.pending = self.pending[:]
+        return index
+
+    def merge_pending(self):
+        if self.pending:
+            self.entries.extend(self.pending)
+            self.entries.sort()
+            self.pending = []
+
+    def complete(self, prefix, limit, field=None):
+        self.merge_pending()
+        entries = self.entries
+        results = []
+        position = bisect_left(entries, (prefix,))
+        while position < len(entries) and len(results) < limit:
+            term, term_field = entries[position]
+            if not term.startswith(prefix):
+                break
+            if field is None or term_field == field:
+                results.append((term_field, term))
+            position += 1
+        return results
+
+
+class OverlayIndex(MutableMapping):
+    """
+    An editable view of a read-only index, keeping the keys that change in an in-memory delta.
+    """
+    def __init__(self, base, copy_value=None):
+        self._base = base
+        self._delta = {}  # Key -> its value now, or None once deleted
+        self._count = len(base)
+        self._copy_value = copy_value if copy_value is not None else partial(array, "I")
+
+    def _own(self, key):
+        postings = self._delta.get(key)
+        if postings is None:
+            postings = self._delta[key] = self._copy_value(self._base[key])
+        return postings
+
+    def add(self, key, recipe_id):
+        """
+        Post recipe_id under key, keeping the IDs sorted. Return True if key is new.
+        """
+        postings = self.get(key)
+        if postings is None:
+            self[key] = array("I", [recipe_id])
+            return True
+        if postings[-1] < recipe_id:
+            self._own(key).append(recipe_id)
+        elif not contains(postings, recipe_id):
+            self._own(key).insert(bisect_left(postings, recipe_id), recipe_id)
+        return False
+
+    def discard(self, key, recipe_id):
+        """
+        Remove recipe_id from key's postings, if it is there. Return True if key is now gone.
+        """
+        postings = self.get(key)
+        if postings is None or not contains(postings, recipe_id):
+            return False
+        if len(postings) == 1:
+            del self[key]
+            return True
+        del self._own(key)[bisect_left(postings, recipe_id)]
+        return False
+
+    def __getitem__(self, key):
+        if key in self._delta:
+            value = self._delta[key]
+            if value is None:
+                raise KeyError(key)
+            return value
+        return self._base[key]
+
+    def __setitem__(self, key, value):
+        if key not in self:
+            self._count += 1
+        self._delta[key] = value
+
+    def __delitem__(self, key):
+        if key not in self:
+            raise KeyError(key)
+        self._delta[key] = None
+        self._count -= 1
+
+    def __contains__(self, key):
+        if key in self._delta:
+            return self._delta[key] is not None
+        return key in self._base
+
+    def __len__(self):
+        return self._count
+
+    def __iter__(self):
+        delta = self._delta
+        for key in self._base:
+            if key not in delta or delta[key] is not None:
+                yield key
+        for key, value in list(delta.items()):
+            if value is not None and key not in self._base:
+                yield key
+
+    def copy(self):
+        index = OverlayIndex(self._base, self._copy_value)
+        index._delta = {key: value if value is None else self._copy_value(value) for key, value in self._delta.items()}
+        index._count = self._count
+        return index
+
+
+def lookup_postings(index, key):
+    """
+    Return the posting list for key in an index, or an empty list.
+    """
+    return index.get(key, [])
+
+
+def intersect_postings(posting_lists):
+    """
+    Intersect sorted posting lists, starting from the smallest one.
+    """
+    posting_lists = sorted(posting_lists, key=len)
+    if not posting_lists:
+        return []
+    result = posting_lists[0]
+    for postings in posting_lists[1:]:
+        if not result:
+            break
+        matched = []
+        start = 0
+        for recipe_id in result:
+            start = bisect_left(postings, recipe_id, start)
+            if start == len(postings):
+                break
+            if postings[start] == recipe_id:
+                matched.append(recipe_id)
+        result = matched
+    return list(result)
+
+
+def contains(postings, recipe_id):
+    """
+    Return whether a sorted posting list contains recipe_id.
+    """
+    position = bisect_left(postings, recipe_id)
+    return position < len(postings) and postings[position] == recipe_id
+
+
+def iter_intersection(posting_lists, after=-1):
+    """
+    Lazily yield the recipe IDs greater than after that are in every sorted posting list.
+    """
+    posting_lists = sorted(posting_lists, key=len)
+    if not posting_lists:
+        return
+    others = posting_lists[1:]
+    starts = [0] * len(others)
+    smallest = posting_lists[0]
+    for recipe_id in islice(smallest, bisect_left(smallest, after + 1), None):
+        for position, postings in enumerate(others):
+            start = bisect_left(postings, recipe_id, starts[position])
+            if start == len(postings):
+                return
+            starts[position] = start
+            if postings[start] != recipe_id:
+                break
+        else:
+            yield recipe_id
+
+
+def iter_difference(postings, excluded_lists, after=-1):
+    """
+    Lazily yield the recipe IDs greater than after in postings but in none of excluded_lists.
+    """
+    for recipe_id in islice(postings, bisect_left(postings, after + 1), None):
+        if not any(contains(excluded, recipe_id) for excluded in excluded_lists):
+            yield recipe_id
+
+
+def copy_instruction_entry(entry):
+    """
+    Return a copy of an InstructionIndex entry that shares none of its arrays.
+    """
+    return [array("I", part) for part in entry]
@@ -0,0 +1,176 @@
+import zlib
+from array import array
+from collections import OrderedDict
+
+
+# Preset zlib dictionary for compressed instructions: phrases that recur across recipes,
+# so even short instructions compress well. The most common phrases go last.
+INSTRUCTION_DICTIONARY = (
+    "Let rest for 10 minutes before serving. Cool before serving. Serve immediately. "
+    "Preheat the oven to 350°F (175°C). Preheat a grill or skillet over medium-high heat. "
+    "Line a baking sheet with parchment paper. In a large bowl, whisk together the flour, "
+    "sugar, baking powder and salt. Stir in the milk, eggs and melted butter until smooth. "
+    "Cover with foil and bake for 25 minutes until golden. Remove from the oven. "
+    "Bring a large pot of salted water to a boil and cook the pasta until al dente. Drain. "
+    "Chop the onion and mince the garlic. Add the chicken and cook until browned. "
+    "Simmer gently for 10 minutes, stirring occasionally. Season with salt and pepper to taste. "
+    "In a skillet, heat olive oil over medium heat and sauté the onions and garlic until softened. "
+    "Add the tomatoes and bring to a simmer. Then add the cheese and stir until melted. "
+    "Serve hot with fresh basil. Mix and bake. Instructions not available.\n"
+).encode("utf-8")
+
+# Instructions held decompressed per book for recently viewed recipes
+INSTRUCTION_CACHE_SIZE = 32
+
+
+class Recipe:
+    def __init__(self, name, ingredients, cuisine, aliases=None, instructions=None):
+        """
+        Initialize a recipe with a name, list of ingredients, cuisine type, optional aliases, and instructions.
+        """
+        self.name = name
+        self.ingredients = ingredients
+        self.cuisine = cuisine
+        self.instructions = instructions or "Instructions not available."
+        self.aliases = aliases or []  # Alternate names for the recipe
+
+    def __str__(self):
+        """
+        Return a string representation of the recipe with full details.
+        """
+        ingredients_str = ", ".join(self.ingredients)
+        return (f"Recipe: {self.name}\nCuisine: {self.cuisine}\nIngredients: {ingredients_str}\n"
+                f"Instructions:\n{self.instructions}")
+
+
+class Vocabulary:
+    def __init__(self):
+        """
+        Initialize an empty table of interned strings and a store for compressed instructions.
+        """
+        self.ids = {}
+        self.strings = []
+        self.instructions = InstructionStore()
+
+    def intern(self, text):
+        """
+        Return the integer ID for a string, adding it to the table the first time it is seen.
+        """
+        string_id = self.ids.get(text)
+        if string_id is None:
+            string_id = len(self.strings)
+            self.ids[text] = string_id
+            self.strings.append(text)
+        return string_id
+
+    def lookup(self, string_ids):
+        """
+        Turn an array of string IDs back into a list of strings.
+        """
+        strings = self.strings
+        return [strings[string_id] for string_id in string_ids]
+
+
+class InstructionStore:
+    def __init__(self, dictionary=INSTRUCTION_DICTIONARY, cache_size=INSTRUCTION_CACHE_SIZE):
+        """
+        Initialize an empty store of zlib-compressed instructions, caching the last cache_size read.
+        """
+        self.dictionary = dictionary
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+        self.cache = OrderedDict()
+        self.cache_size = cache_size
+
+    def add(self, text):
+        """
+        Compress and append a text, returning its ID.
+        """
+        # Raw deflate with a 4 KiB window: no per-text header, and cheap to set up per text
+        compressor = zlib.compressobj(9, zlib.DEFLATED, -12, 5, zdict=self.dictionary)
+        self.data += compressor.compress(text.encode("utf-8")) + compressor.flush()
+        self.offsets.append(len(self.data))
+        return len(self.offsets) - 2
+
+    def get(self, text_id):
+        """
+        Return the text with the given ID, decompressing it unless it was read recently.
+        """
+        text = self.cache.get(text_id)
+        if text is None:
+            decompressor = zlib.decompressobj(-12, zdict=self.dictionary)
+            text = decompressor.decompress(self.data[self.offsets[text_id]:self.offsets[text_id + 1]]).decode("utf-8")
+            self.cache[text_id] = text
+            if len(self.cache) > self.cache_size:
+                try:
+                    self.cache.popitem(last=False)
+                except KeyError:  # Another reader trimmed it first
+                    pass
+        else:
+            try:
+                self.cache.move_to_end(text_id)
+            except KeyError:
+                pass
+        return text
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+
+class CompactRecipe:
+    """
+    A recipe stored as an array of IDs into a shared Vocabulary, with compressed instructions.
+    """
+    __slots__ = ("name", "_instructions", "_vocabulary", "_ids")
+
+    def __init__(self, name, ingredients, cuisine, aliases=None, instructions=None, vocabulary=None):
+        self.name = name
+        self._vocabulary = vocabulary if vocabulary is not None else Vocabulary()
+        if instructions and instructions != "Instructions not available.":
+            self._instructions = self._vocabulary.instructions.add(instructions)
+        else:
+            self._instructions = -1
+        intern = self._vocabulary.intern
+        ids = [intern(cuisine), len(ingredients)]
+        ids.extend(map(intern, ingredients))
+        ids.extend(map(intern, aliases or []))
+        self._ids = array("I", ids)
+
+    @classmethod
+    def from_recipe(cls, recipe, vocabulary):
+        """
+        Build a compact copy of a regular Recipe using the given vocabulary.
+        """
+        return cls(recipe.name, recipe.ingredients, recipe.cuisine, recipe.aliases, recipe.instructions, vocabulary)
+
+    @classmethod
+    def from_ids(cls, name, ids, instructions, vocabulary):
+        """
+        Wrap an already encoded ID array and instruction ID from the given vocabulary.
+        """
+        recipe = cls.__new__(cls)
+        recipe.name = name
+        recipe._ids = ids
+        recipe._instructions = instructions
+        recipe._vocabulary = vocabulary
+        return recipe
+
+    @property
+    def instructions(self):
+        if self._instructions < 0:
+            return "Instructions not available."
+        return self._vocabulary.instructions.get(self._instructions)
+
+    @property
+    def ingredients(self):
+        return self._vocabulary.lookup(self._ids[2:2 + self._ids[1]])
+
+    @property
+    def cuisine(self):
+        return self._vocabulary.strings[self._ids[0]]
+
+    @property
+    def aliases(self):
+        return self._vocabulary.lookup(self._ids[2 + self._ids[1]:])
+
+    __str__ = Recipe.__str__
@@ -0,0 +1,158 @@
+import re
+from functools import lru_cache
+
+from recipe_text import ingredient_key
+
+
+# A Search prompt query is parsed as a boolean expression when it has a field prefix followed
+# directly by its term, a parenthesis, a leading minus, or an upper-case operator, unless it
+# starts with a prefix and a space, as in "name: Mac AND Cheese", which searches the text as typed
+BOOLEAN_SYNTAX = re.compile(r"\b(?:name|ingredient|cuisine):\S|[()]|(?:^|\s)-\S|\b(?:AND|OR|NOT)\b")
+PREFIX_QUERY = re.compile(r"(?:name|ingredient|cuisine|pantry):(?:\s|$)")
+QUERY_TOKEN = re.compile(r'\s*(?:([()])|(-)|"([^"]*)"|([^\s()"]+))')
+QUERY_FIELDS = ("name", "ingredient", "cuisine")
+
+
+def parse_query(query):
+    """
+    Parse a Search prompt query into a hashable (kind, value) pair.
+    """
+    query = query.strip()
+    if query.startswith("text:"):
+        return "text", query[len("text:"):].strip().lower()
+    if BOOLEAN_SYNTAX.search(query) and not PREFIX_QUERY.match(query):
+        try:
+            plan = compile_query(query)
+        except ValueError:
+            plan = None  # Not a valid expression after all, so search for the text as typed
+        if plan is not None:
+            if plan[0] == "term":
+                # A single term is answered like the prefix form, typo tolerance and all
+                field, key = plan[1:]
+                return (field, (key,)) if field == "ingredient" else (field, key)
+            return "boolean", plan
+    if query.startswith("name:"):
+        return "name", query[len("name:"):].strip().lower()
+    if query.startswith("ingredient:"):
+        ingredients = re.split(r"\s+and\s+", query[len("ingredient:"):].strip())
+        return "ingredient", tuple(sorted({ingredient_key(ingredient) for ingredient in ingredients}))
+    if query.startswith("cuisine:"):
+        return "cuisine", query[len("cuisine:"):].strip().lower()
+    if query.startswith("pantry:"):
+        ingredients = query[len("pantry:"):].strip().split(",")
+        return "pantry", tuple(sorted({ingredient_key(ingredient) for ingredient in ingredients} - {""}))
+    return "general", query.lower()
+
+
+@lru_cache(maxsize=1024)
+def compile_query(query):
+    """
+    Compile a boolean query into a plan of term, and, or, and not nodes.
+    """
+    tokens = []
+    position = 0
+    query = query.strip()
+    while position < len(query):
+        match = QUERY_TOKEN.match(query, position)
+        if match is None:
+            raise ValueError(f"unterminated quote in {query!r}")
+        parenthesis, minus, phrase, word = match.groups()
+        if parenthesis or minus:
+            tokens.append(parenthesis or minus)
+        elif phrase is not None:
+            tokens.append(("term", phrase))
+        elif word.upper() in ("AND", "OR", "NOT"):
+            tokens.append(word.upper())
+        elif word.endswith(":") and word[:-1].lower() in QUERY_FIELDS:
+            tokens.append(("field", word[:-1].lower()))
+        elif ":" in word and word.split(":", 1)[0].lower() in QUERY_FIELDS:
+            field, word = word.split(":", 1)
+            tokens.extend([("field", field.lower()), ("term", word)])
+        else:
+            tokens.append(("term", word))
+        position = match.end()
+        while position < len(query) and query[position].isspace():
+            position += 1
+
+    def parse_or(field):
+        children = [parse_and(field)]
+        while tokens and tokens[0] == "OR":
+            tokens.pop(0)
+            children.append(parse_and(field))
+        return combine("or", children)
+
+    def parse_and(field):
+        children = [parse_unary(field)]
+        while tokens and tokens[0] not in ("OR", ")"):
+            if tokens[0] == "AND":
+                tokens.pop(0)
+            children.append(parse_unary(field))
+        return combine("and", children)
+
+    def parse_unary(field):
+        if tokens and tokens[0] in ("NOT", "-"):
+            tokens.pop(0)
+            child = parse_unary(field)
+            return child[1] if child[0] == "not" else ("not", child)
+        return parse_primary(field)
+
+    def parse_primary(field):
+        if not tokens:
+            raise ValueError(f"incomplete query {query!r}")
+        token = tokens.pop(0)
+        if token == "(":
+            node = parse_or(field)
+            if not tokens or tokens.pop(0) != ")":
+                raise ValueError(f"unbalanced parentheses in {query!r}")
+            return node
+        if isinstance(token, tuple) and token[0] == "field":
+            return parse_primary(token[1])
+        if isinstance(token, tuple) and token[1].strip():
+            key = token[1].strip().lower()
+            return "term", field, ingredient_key(key) if field == "ingredient" else key
+        raise ValueError(f"unexpected {token!r} in {query!r}")
+
+    def combine(kind, children):
+        flattened = []
+        for child in children:
+            for grandchild in (child[1] if child[0] == kind else (child,)):
+                if grandchild not in flattened:
+                    flattened.append(grandchild)
+        return flattened[0] if len(flattened) == 1 else (kind, tuple(flattened))
+
+    plan = parse_or("ingredient")
+    if tokens:
+        raise ValueError(f"unexpected {tokens[0]!r} in {query!r}")
+    return plan
+
+
+def plan_nodes(plan):
+    """
+    Yield every node of a compiled plan, parents before their children.
+    """
+    yield plan
+    if plan[0] == "not":
+        yield from plan_nodes(plan[1])
+    elif plan[0] != "term":
+        for child in plan[1]:
+            yield from plan_nodes(child)
+
+
+def encode_cursor(tier, recipe_id):
+    """
+    Return the opaque continuation token for a position in a result stream.
+    """
+    return f"{tier}.{recipe_id}"
+
+
+def decode_cursor(cursor):
+    """
+    Turn a continuation token back into (tier, recipe ID); None means the start.
+    """
+    if cursor is None:
+        return 0, -1
+    try:
+        tier, recipe_id = map(int, cursor.split("."))
+    except (AttributeError, ValueError):
+        raise ValueError(f"invalid cursor: {cursor!r}") from None
+    return tier, recipe_id
@@ -0,0 +1,189 @@
+import asyncio
+import json
+import time
+from collections import deque
+
+from recipe_durable import recipe_as_dict
+
+
+class RecipeServer:
+    """
+    Serve RecipeBook queries over TCP, one JSON object per line in each direction.
+    """
+    def __init__(self, recipe_book, host="127.0.0.1", port=8765, limit=50, latency_window=100000):
+        self.recipe_book = recipe_book
+        self.host = host
+        self.port = port
+        self.limit = limit
+        self.latencies = deque(maxlen=latency_window)
+        self.requests = 0
+        self.server = None
+        self._clients = set()
+        self._pending = None
+        self._dispatcher = None
+
+    async def start(self):
+        """
+        Start listening and return the bound (host, port); port 0 picks a free port.
+        """
+        self._pending = asyncio.Queue()
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        self.server = await asyncio.start_server(self._serve_client, self.host, self.port)
+        self.host, self.port = self.server.sockets[0].getsockname()[:2]
+        return self.host, self.port
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        """
+        Stop accepting connections, let open ones finish their answers, and stop the dispatcher.
+        """
+        self.server.close()
+        for client in list(self._clients):
+            client.cancel()
+        await asyncio.gather(*self._clients, return_exceptions=True)
+        await self.server.wait_closed()
+        self._dispatcher.cancel()
+
+    def latency_stats(self):
+        """
+        Return the request count and the p50/p99 latency in milliseconds.
+        """
+        latencies = sorted(self.latencies)
+        return {"requests": self.requests,
+                "p50_ms": percentile(latencies, 0.50) * 1000,
+                "p99_ms": percentile(latencies, 0.99) * 1000}
+
+    async def _serve_client(self, reader, writer):
+        client = asyncio.current_task()
+        self._clients.add(client)
+        answers = asyncio.Queue()
+        sender = asyncio.create_task(self._send_answers(answers, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                received = time.perf_counter()
+                answer = asyncio.get_running_loop().create_future()
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("a request must be a JSON object")
+                except ValueError as error:
+                    answer.set_result({"error": str(error)})
+                else:
+                    self._pending.put_nowait((request, answer))
+                answers.put_nowait((answer, received))
+        except asyncio.CancelledError:
+            pass  # The server is closing; answer what has already been read
+        finally:
+            answers.put_nowait(None)
+            try:
+                await sender
+            except asyncio.CancelledError:
+                sender.cancel()  # Cancelled again while finishing; drop the unsent answers
+            self._clients.discard(client)
+
+    async def _send_answers(self, answers, writer):
+        try:
+            while True:
+                item = await answers.get()
+                if item is None:
+                    break
+                answer, received = item
+                writer.write(json.dumps(await answer).encode() + b"\n")
+                await writer.drain()
+                self.latencies.append(time.perf_counter() - received)
+                self.requests += 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self):
+        while True:
+            batch = [await self._pending.get()]
+            while not self._pending.empty():
+                batch.append(self._pending.get_nowait())
+            try:
+                self._answer_batch(batch)
+            except Exception as error:  # Never let one batch stop the dispatcher
+                for _, answer in batch:
+                    if not answer.done():
+                        answer.set_result({"error": str(error)})
+
+    def _answer_batch(self, batch):
+        # Group queries by limit so each group is answered with one search_many call
+        queries_by_limit = {}
+        for request, answer in batch:
+            try:
+                problem = request_error(request)
+                if problem is not None:
+                    answer.set_result({"error": problem})
+                elif "query" in request:
+                    limit = request.get("limit", self.limit)
+                    queries_by_limit.setdefault(limit, []).append((request["query"], answer))
+                elif "recipe" in request:
+                    recipe = self.recipe_book.get_recipe_by_name(request["recipe"])
+                    answer.set_result({"recipe": recipe_as_dict(recipe) if recipe else None})
+                else:
+                    answer.set_result(self.latency_stats())
+            except Exception as error:  # Keep serving other clients after a bad request
+                if not answer.done():
+                    answer.set_result({"error": str(error)})
+        for limit, requests in queries_by_limit.items():
+            try:
+                results = self.recipe_book.search_many([str(query) for query, _ in requests], limit)
+            except Exception as error:  # Keep serving other clients after a bad request
+                for _, answer in requests:
+                    answer.set_result({"error": str(error)})
+                continue
+            for (_, answer), recipes in zip(requests, results):
+                answer.set_result({"results": [{"name": recipe.name, "cuisine": recipe.cuisine}
+                                               for recipe in recipes]})
+
+
+def request_error(request):
+    """
+    Return why a RecipeServer request can't be answered, or None if it is well formed.
+    """
+    if "query" in request:
+        if not isinstance(request["query"], str):
+            return "query must be a string"
+        limit = request.get("limit")
+        if limit is not None and (type(limit) is not int or limit < 0):
+            return "limit must be a non-negative integer"
+    elif "recipe" in request:
+        if not isinstance(request["recipe"], str):
+            return "recipe must be a string"
+    elif not request.get("stats"):
+        return "expected a query, recipe or stats request"
+    return None
+
+
+def percentile(sorted_values, fraction):
+    """
+    Return the nearest-rank percentile of an already sorted list (0.0 if it is empty).
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+async def query_recipe_server(host, port, requests):
+    """
+    Send a batch of requests down one connection and return the answers in order.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.writelines(json.dumps(request).encode() + b"\n" for request in requests)
+        await writer.drain()
+        return [json.loads(await reader.readline()) for _ in requests]
+    finally:
+        writer.close()
+        await writer.wait_closed()
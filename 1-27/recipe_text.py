@@ -0,0 +1,135 @@
+from functools import lru_cache
+from itertools import chain
+
+
+# Ingredient canonicalization (see ingredient_keys). Synonyms map a singular spelling to
+# the canonical one; part words name a cut or form of the food before them, which is then
+# the head noun ("chicken breast" is found by "chicken", not "breast").
+INGREDIENT_SYNONYMS = {
+    "parm": "parmesan", "parmigiano": "parmesan", "parmigiano reggiano": "parmesan",
+    "parmesan cheese": "parmesan", "pecorino": "romano cheese", "pecorino romano": "romano cheese",
+    "romano": "romano cheese", "beef patty": "ground beef", "hamburger": "ground beef",
+    "minced beef": "ground beef", "scallion": "green onion", "spring onion": "green onion",
+    "garbanzo": "chickpea", "garbanzo bean": "chickpea", "aubergine": "eggplant",
+    "courgette": "zucchini", "coriander leaf": "cilantro", "capsicum": "bell pepper",
+    "corn tortilla": "tortilla", "flour tortilla": "tortilla", "confectioners sugar": "powdered sugar",
+}
+INGREDIENT_PARTS = {"breast", "thigh", "wing", "drumstick", "fillet", "clove", "sheet", "slice", "leaf", "patty"}
+
+# Words that end in s but are not plurals, and the singular spellings of the ones used only
+# in the plural, so "oat" and "oats" share a key. Words ending in -is are plurals unless
+# listed here ("kiwis" -> "kiwi", "chilis" -> "chili", but "cassis" stays)
+INGREDIENT_NON_PLURALS = {"molasses", "hummus", "couscous", "asparagus", "swiss", "citrus", "grits", "oats",
+                          "cassis", "pastis"}
+INGREDIENT_PLURAL_ONLY = {"oat": "oats", "grit": "grits"}
+
+# Nouns ending in -ie, whose plurals are not -y words ("cookies" is not "cooky")
+INGREDIENT_IE_NOUNS = {"cookie", "pie", "potpie", "brownie", "veggie", "smoothie", "hoagie", "pierogie", "goodie"}
+
+# Nouns ending in -che, whose plurals lose only the s ("quiches" -> "quiche", "brioches" ->
+# "brioche", where "peaches" -> "peach")
+INGREDIENT_CHE_NOUNS = {"quiche", "brioche", "ganache", "panache", "ceviche", "pastiche", "mâche"}
+
+# Ingredient spellings whose keys are memoized. Queries go through the same functions, so the
+# memo is bounded to keep a long-running server from holding every query it has seen
+INGREDIENT_CACHE_SIZE = 1 << 16
+
+
+def edit_distance(first, second):
+    """
+    Return the Levenshtein distance between two strings.
+    """
+    if len(first) < len(second):
+        first, second = second, first
+    previous = list(range(len(second) + 1))
+    for i, first_char in enumerate(first, 1):
+        current = [i]
+        for j, second_char in enumerate(second, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (first_char != second_char)))
+        previous = current
+    return previous[-1]
+
+
+def typo_budget(word):
+    """
+    Return how many typos to tolerate in a word: none for very short words, then one, then two.
+    """
+    return 0 if len(word) <= 2 else 1 if len(word) <= 4 else 2
+
+
+def deletion_variants(word, max_deletions):
+    """
+    Return every string obtained from word by deleting up to max_deletions characters.
+    """
+    variants = {word}
+    frontier = {word}
+    for _ in range(max_deletions):
+        frontier = {term[:i] + term[i + 1:] for term in frontier for i in range(len(term))}
+        variants |= frontier
+    return variants
+
+
+def recipe_keys(recipe):
+    """
+    Return the set of (field, key) index keys a recipe is posted under.
+    """
+    keys = {("name", name.lower()) for name in chain((recipe.name,), recipe.aliases)}
+    keys.update(("ingredient", key) for ingredient in recipe.ingredients for key in ingredient_keys(ingredient))
+    keys.add(("cuisine", recipe.cuisine.lower()))
+    return keys
+
+
+@lru_cache(maxsize=INGREDIENT_CACHE_SIZE)
+def ingredient_keys(ingredient):
+    """
+    Return the index keys an ingredient is posted under: its canonical key and head nouns.
+    """
+    spelling = singular_spelling(ingredient)
+    keys = [INGREDIENT_SYNONYMS.get(spelling, spelling)]
+    for phrase in (keys[0], spelling):
+        words = phrase.split()
+        if len(words) < 2:
+            continue
+        head = words[-2] if words[-1] in INGREDIENT_PARTS else words[-1]
+        head = INGREDIENT_SYNONYMS.get(head, head)
+        if head not in keys:
+            keys.append(head)
+    return tuple(keys)
+
+
+@lru_cache(maxsize=INGREDIENT_CACHE_SIZE)
+def ingredient_key(ingredient):
+    """
+    Return the canonical key for an ingredient spelling.
+    """
+    spelling = singular_spelling(ingredient)
+    return INGREDIENT_SYNONYMS.get(spelling, spelling)
+
+
+def singular_spelling(ingredient):
+    """
+    Return an ingredient spelling casefolded, whitespace collapsed, and the last word singularized.
+    """
+    words = ingredient.casefold().split()
+    if not words:
+        return ""
+    words[-1] = singularize(words[-1])
+    return " ".join(words)
+
+
+def singularize(word):
+    """
+    Return the singular of an English food noun, leaving words that aren't plurals alone.
+    """
+    word = INGREDIENT_PLURAL_ONLY.get(word, word)
+    if len(word) <= 3 or word in INGREDIENT_NON_PLURALS or word.endswith(("ss", "us")):
+        return word
+    if word.endswith("ies"):
+        return word[:-1] if word[:-1] in INGREDIENT_IE_NOUNS else word[:-3] + "y"
+    if word.endswith(("aves", "lves")):
+        return word[:-3] + "f"
+    if word.endswith(("oes", "ches", "shes", "xes")) and word[:-1] not in INGREDIENT_CHE_NOUNS:
+        return word[:-2]
+    if word.endswith("s"):
+        return word[:-1]
+    return word
@@ -1,3 +1,18 @@
+import difflib
+
+# Close names offered for a misspelled name. Names, aliases, and name words are also stored
+# under every spelling with one letter deleted, so a typo (a wrong, missing, extra, or swapped
+# letter) shares a spelling with the name it misspells and only those names are compared
+FUZZY_MATCHES = 5
+
+
+def deletion_variants(word):
+    """
+    Return word and every spelling of it with one letter deleted.
+    """
+    return {word, *(word[:i] + word[i + 1:] for i in range(len(word)))}
+
+
 class Recipe:
     def __init__(self, name, ingredients, cuisine, aliases=None):
         """
@@ -19,38 +34,82 @@ class Recipe:
 class RecipeBook:
     def __init__(self):
         """
-        Initialize an empty recipe collection and a dictionary for aliases.
+        Initialize an empty recipe collection, a dictionary from names and aliases
+        to recipe IDs, an inverted index from ingredient to recipe IDs (positions in self.recipes),
+        and a partition of recipe IDs by cuisine.
         """
         self.recipes = []
         self.alias_map = {}
+        self.fuzzy_keys = {}  # Names, aliases, and words of names -> recipe IDs, for typo-tolerant lookup
+        self.typo_keys = {}  # Deletion variant -> fuzzy keys it was derived from
+        self.ingredient_index = {}
+        self.cuisine_index = {}
 
     def add_recipe(self, recipe):
         """
-        Add a new recipe to the collection and update the alias map.
+        Add a new recipe to the collection and update the alias map and the
+        ingredient and cuisine indexes.
         """
+        recipe_id = len(self.recipes)
         self.recipes.append(recipe)
-        # Add the primary name and aliases to the alias map
-        self.alias_map[recipe.name.lower()] = recipe
-        for alias in recipe.aliases:
-            self.alias_map[alias.lower()] = recipe
-
-    def find_by_name(self, name):
-        """
-        Search for a recipe by its exact name or alias.
-        """
-        return self.alias_map.get(name.lower(), None)
+        self.cuisine_index.setdefault(recipe.cuisine.lower(), []).append(recipe_id)
+        # Post the recipe ID under each normalized ingredient (once per recipe)
+        for ingredient in recipe.ingredients:
+            postings = self.ingredient_index.setdefault(ingredient.lower(), [])
+            if not postings or postings[-1] != recipe_id:
+                postings.append(recipe_id)
+        # Add the primary name and aliases to the alias map, keeping other recipes that share them
+        names = [recipe.name.lower(), *map(str.lower, recipe.aliases)]
+        for key in names:
+            postings = self.alias_map.setdefault(key, [])
+            if not postings or postings[-1] != recipe_id:
+                postings.append(recipe_id)
+        for key in [*names, *recipe.name.lower().split()]:
+            postings = self.fuzzy_keys.get(key)
+            if postings is None:
+                postings = self.fuzzy_keys[key] = []
+                for variant in deletion_variants(key):
+                    self.typo_keys.setdefault(variant, []).append(key)
+            if not postings or postings[-1] != recipe_id:
+                postings.append(recipe_id)
+
+    def find_by_name(self, name, fuzzy=True):
+        """
+        Search for recipes by exact name or alias. If nothing matches exactly and fuzzy
+        is set, return the recipes of the FUZZY_MATCHES names, aliases, or name words
+        closest to a typo, best match first.
+        """
+        recipe_ids = self.alias_map.get(name.lower(), [])
+        if not recipe_ids and fuzzy:
+            candidates = {key for variant in deletion_variants(name.lower()) for key in self.typo_keys.get(variant, ())}
+            recipe_ids = {}
+            for key in difflib.get_close_matches(name.lower(), candidates, n=FUZZY_MATCHES, cutoff=0.8):
+                recipe_ids.update(dict.fromkeys(self.fuzzy_keys[key]))
+        return [self.recipes[recipe_id] for recipe_id in recipe_ids]
 
     def search_by_ingredient(self, ingredient):
         """
         Search for recipes that contain a specific ingredient.
         """
-        return [recipe for recipe in self.recipes if ingredient.lower() in map(str.lower, recipe.ingredients)]
+        return [self.recipes[recipe_id] for recipe_id in self.ingredient_index.get(ingredient.lower(), [])]
 
     def search_by_cuisine(self, cuisine):
         """
         Search for recipes by cuisine type.
         """
-        return [recipe for recipe in self.recipes if recipe.cuisine.lower() == cuisine.lower()]
+        return [self.recipes[recipe_id] for recipe_id in self.cuisine_index.get(cuisine.lower(), [])]
+
+    def cuisine_count(self, cuisine):
+        """
+        Return how many recipes belong to a cuisine without listing them.
+        """
+        return len(self.cuisine_index.get(cuisine.lower(), []))
+
+    def cuisine_counts(self):
+        """
+        Return a dictionary of cuisine name to recipe count, in the order cuisines were first added.
+        """
+        return {self.recipes[recipe_ids[0]].cuisine: len(recipe_ids) for recipe_ids in self.cuisine_index.values()}
 
     def get_all_recipes(self):
         """
@@ -73,8 +132,8 @@ def interactive_recipe_search():
     recipe_book = RecipeBook()
     
     # Italian Cuisine
-    recipe_book.add_recipe(Recipe("Spaghetti Carbonara", ["spaghetti", "eggs", "bacon", "parmesan"], "Italian", ["egg","pasta","parm","carbonara","cheese","spagetti"]))
-    recipe_book.add_recipe(Recipe("Margherita Pizza", ["dough", "tomato", "mozzarella", "basil"], "Italian",["cheese","pizza","piza"]))
+    recipe_book.add_recipe(Recipe("Spaghetti Carbonara", ["spaghetti", "eggs", "bacon", "parmesan"], "Italian", ["egg","pasta","parm","carbonara","cheese"]))
+    recipe_book.add_recipe(Recipe("Margherita Pizza", ["dough", "tomato", "mozzarella", "basil"], "Italian",["cheese","pizza"]))
     recipe_book.add_recipe(Recipe("Chicken Alfredo", ["penne", "chicken", "alfredo sauce","parmesan", "butter"], "Italian", ["pasta", "alfredo"]))
     recipe_book.add_recipe(Recipe("Lasagna", ["pasta", "ricotta", "ground beef", "tomato sauce"], "Italian",["pasta","beef","cheese","tomato"]))
     
@@ -106,11 +165,13 @@ def interactive_recipe_search():
             print(recipe_book)
             continue
 
-        # Search for a recipe by name or alias
-        recipe_by_name = recipe_book.find_by_name(query)
-        if recipe_by_name:
-            print("\nRecipe Found:\n")
-            print(recipe_by_name)
+        # Search for recipes by name or alias
+        recipes_by_name = recipe_book.find_by_name(query, fuzzy=False)
+        if recipes_by_name:
+            print("\nRecipes Found:\n")
+            for recipe in recipes_by_name:
+                print(recipe)
+                print()
             continue
 
         # Search for recipes by ingredient
@@ -131,6 +192,15 @@ def interactive_recipe_search():
                 print()
             continue
 
+        # Try the closest name in case of a typo
+        recipes_by_name = recipe_book.find_by_name(query)
+        if recipes_by_name:
+            print("\nDid you mean:\n")
+            for recipe in recipes_by_name:
+                print(recipe)
+                print()
+            continue
+
         # If no match found
         print("\nNo Recipes Available.\n")
 
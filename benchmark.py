@@ -0,0 +1,293 @@
+import argparse
+import gc
+import importlib.machinery
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from bisect import bisect_left
+from itertools import accumulate
+
+# Every script in the repo that defines its own RecipeBook
+VARIANTS = [
+    "Recipe_book.py", "Edit.py", "Recipe_Finder.py", "save.py", "rs",
+    "1-24/9:38.py", "1-24/9:57.py", "1-24/11:47.py", "1-24/11:53.py", "1-24/11:57.py",
+    "1-24/12:00.py", "1-24/12:14.py", "1-27/9:46.py", "1-27/9:51.py",
+]
+
+OPERATIONS = ["add_recipe", "find_by_name", "search_by_ingredient", "search_by_cuisine", "general_search"]
+
+CUISINES = ["Italian", "Mexican", "American", "Chinese", "Indian", "French", "Japanese", "Thai",
+            "Greek", "Spanish", "Korean", "Vietnamese", "Turkish", "Lebanese", "Ethiopian",
+            "Moroccan", "Brazilian", "Peruvian", "German", "British"]
+WORDS = ["spicy", "crispy", "baked", "grilled", "creamy", "smoky", "roasted", "fried", "braised",
+         "stuffed", "golden", "zesty", "tangy", "sweet", "savory", "rustic", "classic", "quick"]
+DISHES = ["tacos", "soup", "salad", "stew", "curry", "pasta", "pie", "bowl", "wrap", "noodles",
+          "casserole", "sandwich", "risotto", "skewers", "dumplings", "bake", "fritters", "rolls"]
+
+
+def load_variant(path):
+    """
+    Import one recipe script by path under a throwaway module name. Scripts like '1-24/9:38.py'
+    and 'rs' are not importable by name, so they are loaded straight from the file.
+    """
+    name = "recipe_variant_" + "".join(c if c.isalnum() else "_" for c in path)
+    loader = importlib.machinery.SourceFileLoader(name, path)
+    spec = importlib.util.spec_from_loader(name, loader)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module  # Some scripts use dataclasses/pickle, which look themselves up here
+    loader.exec_module(module)
+    return module
+
+
+def zipf_sampler(count, exponent, generator):
+    """
+    Return a function that draws k indexes in range(count) with Zipfian frequency:
+    index i is drawn in proportion to 1 / (i + 1) ** exponent.
+    """
+    cumulative = list(accumulate(1 / (rank + 1) ** exponent for rank in range(count)))
+    total = cumulative[-1]
+
+    def sample(k):
+        return [bisect_left(cumulative, generator.random() * total) for _ in range(k)]
+    return sample
+
+
+def generate_catalogue(size, seed=0, vocabulary=None, exponent=1.1):
+    """
+    Yield size synthetic (name, ingredients, cuisine, aliases) rows. Ingredient and cuisine
+    frequencies are Zipfian, like real catalogues where salt and eggs are everywhere and
+    most ingredients are rare. The same seed always gives the same catalogue.
+    """
+    generator = random.Random(seed)
+    vocabulary = vocabulary or max(1000, int(size ** 0.5) * 10)
+    ingredient_sample = zipf_sampler(vocabulary, exponent, generator)
+    cuisine_sample = zipf_sampler(len(CUISINES), exponent, generator)
+    for number in range(size):
+        word = WORDS[number % len(WORDS)]
+        dish = DISHES[(number // len(WORDS)) % len(DISHES)]
+        name = f"{word.title()} {dish.title()} {number}"
+        ingredients = list(dict.fromkeys(f"ingredient {index}" for index in ingredient_sample(generator.randint(3, 12))))
+        aliases = [f"{word} {dish}"] if number % 10 == 0 else []
+        yield name, ingredients, CUISINES[cuisine_sample(1)[0]], aliases
+
+
+def query_workload(size, count, seed=0, vocabulary=None, exponent=1.1):
+    """
+    Return the queries each search operation is timed on: names of recipes in the catalogue,
+    and ingredients and cuisines drawn with the catalogue's own Zipfian skew.
+    """
+    generator = random.Random(seed + 1)
+    vocabulary = vocabulary or max(1000, int(size ** 0.5) * 10)
+    ingredient_sample = zipf_sampler(vocabulary, exponent, generator)
+    cuisine_sample = zipf_sampler(len(CUISINES), exponent, generator)
+    names = []
+    for number in (generator.randrange(size) for _ in range(count)):
+        word = WORDS[number % len(WORDS)]
+        dish = DISHES[(number // len(WORDS)) % len(DISHES)]
+        names.append(f"{word.title()} {dish.title()} {number}")
+    ingredients = [f"ingredient {index}" for index in ingredient_sample(count)]
+    cuisines = [CUISINES[index] for index in cuisine_sample(count)]
+    return {
+        "find_by_name": names,
+        "search_by_ingredient": ingredients,
+        "search_by_cuisine": cuisines,
+        "general_search": [generator.choice((names, ingredients, cuisines))[i] for i in range(count)],
+    }
+
+
+def operation_call(recipe_book, operation):
+    """
+    Return a one-argument function running operation on recipe_book, adapting to the variant's
+    signature, or None if the variant doesn't support it.
+    """
+    method = getattr(recipe_book, operation, None)
+    if method is None:
+        return None
+    if operation == "search_by_ingredient":
+        parameters = list(inspect.signature(method).parameters)
+        if parameters and parameters[0] == "ingredients":
+            return lambda ingredient: method([ingredient])
+    return method
+
+
+def time_calls(call, arguments, budget):
+    """
+    Call call on each argument until they run out or budget seconds have passed.
+    Return (calls made, seconds taken).
+    """
+    calls = 0
+    start = time.perf_counter()
+    for argument in arguments:
+        call(argument)
+        calls += 1
+        if time.perf_counter() - start > budget:
+            break
+    return calls, time.perf_counter() - start
+
+
+def new_recipe_book(module):
+    """
+    Return an empty RecipeBook from the variant. A variant with a query cache gets it turned
+    off, since the Zipfian workload repeats queries and would otherwise time cache hits.
+    """
+    if "cache_size" in inspect.signature(module.RecipeBook).parameters:
+        return module.RecipeBook(cache_size=0)
+    return module.RecipeBook()
+
+
+def build(module, size, seed, budget):
+    """
+    Fill a new RecipeBook from the variant with add_recipe. Return the book, how many recipes
+    made it in before the time budget ran out, and the seconds taken.
+    """
+    recipe_book = new_recipe_book(module)
+    gc.collect()
+    recipes = (module.Recipe(*row) for row in generate_catalogue(size, seed))
+    added, seconds = time_calls(recipe_book.add_recipe, recipes, budget)
+    return recipe_book, added, seconds
+
+
+def build_memory(module, size, seed):
+    """
+    Return the bytes still allocated after building a book of size recipes, book included.
+    """
+    gc.collect()
+    tracemalloc.start()
+    try:
+        recipe_book = new_recipe_book(module)
+        for row in generate_catalogue(size, seed):
+            recipe_book.add_recipe(module.Recipe(*row))
+        gc.collect()
+        return tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_variant(path, sizes, queries, seed, budget, memory):
+    """
+    Benchmark one variant at each catalogue size and return its result records. A variant
+    that fails to load or to run an operation gets an error record, not an exception.
+    """
+    records = []
+    try:
+        module = load_variant(path)
+        if not hasattr(module, "RecipeBook") or not hasattr(module, "Recipe"):
+            raise AttributeError("no Recipe and RecipeBook classes")
+    except Exception as error:  # Broken or non-recipe scripts are reported, not fatal
+        return [{"variant": path, "error": f"{type(error).__name__}: {error}"}]
+
+    for size in sizes:
+        base = {"variant": path, "size": size}
+        try:
+            recipe_book, added, seconds = build(module, size, seed, budget)
+        except Exception as error:
+            records.append(dict(base, operation="add_recipe", error=f"{type(error).__name__}: {error}"))
+            continue
+        record = dict(base, operation="add_recipe", calls=added, seconds=seconds,
+                      ops_per_second=added / seconds if seconds else None, complete=added == size)
+        if memory and added == size:
+            record["bytes"] = build_memory(module, size, seed)
+            record["bytes_per_recipe"] = record["bytes"] / size
+        records.append(record)
+        if added < size:
+            # Searching a partial catalogue would not be comparable with the other variants
+            continue
+
+        workload = query_workload(size, queries, seed)
+        for operation in OPERATIONS[1:]:
+            call = operation_call(recipe_book, operation)
+            if call is None:
+                records.append(dict(base, operation=operation, error="unsupported"))
+                continue
+            try:
+                calls, seconds = time_calls(call, workload[operation], budget)
+            except Exception as error:
+                records.append(dict(base, operation=operation, error=f"{type(error).__name__}: {error}"))
+                continue
+            records.append(dict(base, operation=operation, calls=calls, seconds=seconds,
+                                ops_per_second=calls / seconds if seconds else None,
+                                mean_us=seconds / calls * 1e6 if calls else None))
+        del recipe_book
+    return records
+
+
+def regressions(results, baseline, tolerance):
+    """
+    Compare results with an earlier run and return a message for every (variant, size,
+    operation) whose throughput fell by more than tolerance, or whose memory grew by more.
+    """
+    previous = {(record["variant"], record.get("size"), record.get("operation")): record
+                for record in baseline["results"]}
+    messages = []
+    for record in results:
+        before = previous.get((record["variant"], record.get("size"), record.get("operation")))
+        if before is None:
+            continue
+        label = f"{record['variant']} size={record.get('size')} {record.get('operation')}"
+        if before.get("ops_per_second") and record.get("ops_per_second") is not None:
+            if record["ops_per_second"] < before["ops_per_second"] * (1 - tolerance):
+                messages.append(f"{label}: {before['ops_per_second']:.0f} -> {record['ops_per_second']:.0f} ops/s")
+        if before.get("bytes") and record.get("bytes"):
+            if record["bytes"] > before["bytes"] * (1 + tolerance):
+                messages.append(f"{label}: {before['bytes']} -> {record['bytes']} bytes")
+        if "error" in record and "error" not in before:
+            messages.append(f"{label}: now fails with {record['error']}")
+    return messages
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the RecipeBook variants on synthetic catalogues.")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="comma-separated catalogue sizes (default: %(default)s; up to 10000000 works)")
+    parser.add_argument("--variants", default=",".join(VARIANTS),
+                        help="comma-separated script paths, relative to the repo (default: all of them)")
+    parser.add_argument("--queries", type=int, default=1000, help="queries per search operation")
+    parser.add_argument("--budget", type=float, default=10.0,
+                        help="seconds allowed per operation before it is cut short (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc build pass")
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    parser.add_argument("--baseline", help="earlier JSON results to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="relative slowdown or memory growth reported as a regression")
+    args = parser.parse_args(argv)
+
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = []
+    for path in args.variants.split(","):
+        print(f"Benchmarking {path}...", file=sys.stderr)
+        results.extend(benchmark_variant(path, sizes, args.queries, args.seed, args.budget, not args.no_memory))
+
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "queries": args.queries,
+        "budget": args.budget,
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            messages = regressions(results, json.load(file), args.tolerance)
+        for message in messages:
+            print(f"REGRESSION {message}", file=sys.stderr)
+        return 1 if messages else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,18 @@
+import difflib
+
+# Close names offered for a misspelled name. Names, aliases, and name words are also stored
+# under every spelling with one letter deleted, so a typo (a wrong, missing, extra, or swapped
+# letter) shares a spelling with the name it misspells and only those names are compared
+FUZZY_MATCHES = 5
+
+
+def deletion_variants(word):
+    """
+    Return word and every spelling of it with one letter deleted.
+    """
+    return {word, *(word[:i] + word[i + 1:] for i in range(len(word)))}
+
+
 class Recipe:
     def __init__(self, name, ingredients, cuisine, aliases=None):
         """
@@ -23,6 +38,8 @@ class RecipeBook:
         """
         self.recipes = []
         self.alias_map = {}
+        self.fuzzy_keys = {}  # Names, aliases, and words of names, for typo-tolerant lookup
+        self.typo_keys = {}  # Deletion variant -> fuzzy keys it was derived from
 
     def add_recipe(self, recipe):
         """
@@ -33,12 +50,32 @@ class RecipeBook:
         self.alias_map[recipe.name.lower()] = recipe
         for alias in recipe.aliases:
             self.alias_map[alias.lower()] = recipe
+        for key in [recipe.name.lower(), *recipe.name.lower().split(), *map(str.lower, recipe.aliases)]:
+            if key not in self.fuzzy_keys:
+                self.fuzzy_keys[key] = recipe
+                for variant in deletion_variants(key):
+                    self.typo_keys.setdefault(variant, []).append(key)
+
+    def find_by_name(self, name, fuzzy=True):
+        """
+        Search for a recipe by its exact name or alias. If nothing matches exactly and
+        fuzzy is set, return the recipe whose name, alias, or name word is closest to a typo.
+        """
+        recipe = self.alias_map.get(name.lower(), None)
+        if recipe is None and fuzzy:
+            recipes = self.find_close_recipes(name, 1)
+            if recipes:
+                recipe = recipes[0]
+        return recipe
 
-    def find_by_name(self, name):
+    def find_close_recipes(self, name, limit=FUZZY_MATCHES):
         """
-        Search for a recipe by its exact name or alias.
+        Return the recipes of up to limit names, aliases, or name words closest to a typo,
+        best match first.
         """
-        return self.alias_map.get(name.lower(), None)
+        candidates = {key for variant in deletion_variants(name.lower()) for key in self.typo_keys.get(variant, ())}
+        matches = difflib.get_close_matches(name.lower(), candidates, n=limit, cutoff=0.8)
+        return list(dict.fromkeys(self.fuzzy_keys[key] for key in matches))
 
     def search_by_ingredient(self, ingredient):
         """
@@ -73,8 +110,8 @@ def interactive_recipe_search():
     recipe_book = RecipeBook()
     
     # Italian Cuisine
-    recipe_book.add_recipe(Recipe("Spaghetti Carbonara", ["spaghetti", "eggs", "bacon", "parmesan"], "Italian", ["pasta","parm","carbonara","cheese", "spageti"]))
-    recipe_book.add_recipe(Recipe("Margherita Pizza", ["dough", "tomato", "mozzarella", "basil"], "Italian",["cheese","pizza","piza"]))
+    recipe_book.add_recipe(Recipe("Spaghetti Carbonara", ["spaghetti", "eggs", "bacon", "parmesan"], "Italian", ["pasta","parm","carbonara","cheese"]))
+    recipe_book.add_recipe(Recipe("Margherita Pizza", ["dough", "tomato", "mozzarella", "basil"], "Italian",["cheese","pizza"]))
     recipe_book.add_recipe(Recipe("Chicken Alfredo", ["penne", "chicken", "alfredo sauce","parmesan", "butter"], "Italian", ["pasta", "alfredo"]))
     recipe_book.add_recipe(Recipe("Lasagna", ["pasta", "ricotta", "ground beef", "tomato sauce"], "Italian",["beef","cheese","tomato"]))
     
@@ -107,15 +144,20 @@ def interactive_recipe_search():
             continue
 
         # Perform the combined search
-        recipe_by_name = recipe_book.find_by_name(query)
+        recipe_by_name = recipe_book.find_by_name(query, fuzzy=False)
         recipes_by_ingredient = recipe_book.search_by_ingredient(query)
         recipes_by_cuisine = recipe_book.search_by_cuisine(query)
+        recipes_by_typo = []
+        if not recipe_by_name and not recipes_by_ingredient:
+            # Nothing matched exactly, so try the closest names in case of a typo
+            recipes_by_typo = recipe_book.find_close_recipes(query)
 
         # Combine all results into a set to avoid duplicates
         results = set()
         if recipe_by_name:
             results.add(recipe_by_name)
         results.update(recipes_by_ingredient)
+        results.update(recipes_by_typo)
 
         if results:
             print("\nRecipes Found:\n")